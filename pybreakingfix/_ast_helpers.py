@@ -1,23 +1,153 @@
 from __future__ import annotations
 
 import ast
+import bisect
 import warnings
 from collections.abc import Container
+from collections.abc import Iterable
+from typing import NamedTuple
+from typing import TYPE_CHECKING
 
 from tokenize_rt import Offset
 
+if TYPE_CHECKING:
+    import mmap
 
-def ast_parse(contents_text: str) -> ast.Module:
+
+def ast_parse(contents: str | bytes | mmap.mmap) -> ast.Module:
+    """parse source text or, without any copy, the (mapped) bytes of a file"""
+    if isinstance(contents, str):
+        contents = contents.encode()
     # intentionally ignore warnings, we might be fixing warning-ridden syntax
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
-        return ast.parse(contents_text.encode())
+        return ast.parse(contents)
 
 
 def ast_to_offset(node: ast.expr | ast.stmt) -> Offset:
     return Offset(node.lineno, node.col_offset)
 
 
+def _start(node: ast.stmt | ast.excepthandler) -> tuple[int, int]:
+    """the position of a statement, including its decorators"""
+    decorators = getattr(node, 'decorator_list', None)
+    if decorators:
+        return decorators[0].lineno, decorators[0].col_offset
+    else:
+        return node.lineno, node.col_offset
+
+
+def _start_line(node: ast.stmt | ast.excepthandler) -> int:
+    return _start(node)[0]
+
+
+def _end(node: ast.stmt | ast.excepthandler) -> tuple[int, int]:
+    # (always set by `ast.parse`)
+    assert node.end_lineno is not None and node.end_col_offset is not None
+    return node.end_lineno, node.end_col_offset
+
+
+def _blocks(node: ast.AST) -> list[list[ast.stmt | ast.excepthandler]]:
+    """the blocks of statements nested in `node`, in order"""
+    ret = []
+    for name in node._fields:
+        value = getattr(node, name)
+        if value and isinstance(value, list):
+            if isinstance(value[0], (ast.stmt, ast.excepthandler)):
+                ret.append(value)
+            elif isinstance(value[0], ast.match_case):
+                ret.extend(case.body for case in value)
+    return ret
+
+
+class Statement(NamedTuple):
+    """the lines of a statement, see `enclosing_statements`"""
+    start_line: int
+    start_col: int
+    end_line: int
+    # the statement this one is nested in
+    parent: Statement | None
+
+
+def _header(
+        statement: Statement,
+        blocks: list[list[ast.stmt | ast.excepthandler]],
+        line: int,
+) -> Statement:
+    """the header of a statement: up to the first nested statement after
+    `line` (on a later line)
+    """
+    for block in blocks:
+        if _start_line(block[-1]) > line:
+            k = bisect.bisect_right(block, line, key=_start_line)
+            return statement._replace(end_line=_start_line(block[k]) - 1)
+    return statement
+
+
+def enclosing_statements(
+        tree: ast.Module,
+        offsets: Iterable[tuple[int, int]],
+) -> dict[tuple[int, int], Statement | None]:
+    """the innermost statement containing each offset
+
+    a statement starts with its decorators, or with the statements before
+    it on its line (`x = 1; y`).  when an offset is in the header of a
+    compound statement, that ends before the first statement nested in it
+    on a later line.
+
+    every offset is located in a single descent: at each level the
+    statements containing them are found by bisection, so this takes time
+    proportional to the statements enclosing some offset rather than to
+    the size of the file (or to the depth for every offset).
+    """
+    ret: dict[tuple[int, int], Statement | None] = {}
+    todo: list[tuple[ast.AST, list[tuple[int, int]], Statement | None]]
+    todo = [(tree, sorted(offsets), None)]
+    while todo:
+        node, node_offsets, statement = todo.pop()
+        blocks = _blocks(node)
+        # the offsets which are not in a nested statement
+        header = []
+        pos = 0
+        for block in blocks:
+            start = bisect.bisect_left(node_offsets, _start(block[0]))
+            end = bisect.bisect_left(node_offsets, _end(block[-1]))
+            header.extend(node_offsets[pos:start])
+            pos = start
+            while pos < end:
+                k = bisect.bisect_right(
+                    block, node_offsets[pos], key=_start,
+                ) - 1
+                child = block[k]
+                child_end = bisect.bisect_left(
+                    node_offsets, _end(child), lo=pos, hi=end,
+                )
+                if child_end == pos:  # between statements
+                    header.append(node_offsets[pos])
+                    pos += 1
+                    continue
+
+                first = bisect.bisect_left(
+                    block, _start_line(child), hi=k, key=_start_line,
+                )
+                start_line, start_col = _start(block[first])
+                child_statement = Statement(
+                    start_line, start_col, _end(child)[0], statement,
+                )
+                todo.append(
+                    (child, node_offsets[pos:child_end], child_statement),
+                )
+                pos = child_end
+        header.extend(node_offsets[pos:])
+
+        for offset in header:
+            if statement is None:
+                ret[offset] = None
+            else:
+                ret[offset] = _header(statement, blocks, offset[0])
+    return ret
+
+
 def is_name_attr(
         node: ast.AST,
         imports: dict[str, set[str]],
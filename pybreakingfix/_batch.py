@@ -0,0 +1,86 @@
+"""fix many sources in a single process, read from stdin
+
+each line of input is a json record `{"filename": "...", "source": "<base64>"}`
+and for each one a json line is written (and flushed) as soon as it is done:
+`{"filename": "...", "ret": ..., "source": "<base64>", "messages": [...]}`
+where `source` is the rewritten source (`null` if unchanged or with --check)
+and each message is
+`{"line": ..., "col": ..., "rule": "...", "severity": "...", "args": [...]}`.
+a record which cannot be read gets
+`{"filename": ..., "ret": 2, "error": "..."}`.
+
+nothing is written to disk, the filenames are only passed back.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import IO
+
+from pybreakingfix._data import Message
+from pybreakingfix._main import EXIT_FATAL
+
+
+def _message(msg: Message) -> dict[str, object]:
+    return {
+        'line': msg.line,
+        'col': msg.col,
+        'rule': msg.rule,
+        'severity': msg.severity,
+        'args': list(msg.args),
+    }
+
+
+def _handle(
+        line: bytes,
+        fix: Callable[[str, bytes], tuple[int, list[Message], bytes | None]],
+        check: bool,
+) -> tuple[int, dict[str, object]]:
+    filename = None
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError('expected an object')
+        filename = record.get('filename')
+        source = record.get('source')
+        if not isinstance(source, str):
+            raise ValueError('expected "source" to be a base64 string')
+        contents_bytes = base64.b64decode(source, validate=True)
+    except ValueError as e:  # including json / base64 errors
+        error = f'bad record: {e}'
+        return EXIT_FATAL, {
+            'filename': filename, 'ret': EXIT_FATAL, 'error': error,
+        }
+
+    # (the name of the source for --timings, `-` when the record has none)
+    name = filename if isinstance(filename, str) else '-'
+    ret, messages, new_contents = fix(name, contents_bytes)
+    if check or new_contents is None:
+        new_source = None
+    else:
+        new_source = base64.b64encode(new_contents).decode()
+    return ret, {
+        'filename': filename,
+        'ret': ret,
+        'source': new_source,
+        'messages': [_message(msg) for msg in messages],
+    }
+
+
+def run(
+        stdin: IO[bytes],
+        stdout: IO[str],
+        fix: Callable[[str, bytes], tuple[int, list[Message], bytes | None]],
+        *,
+        check: bool,
+) -> Iterator[int]:
+    """answer each record from `stdin`, yielding their exit statuses"""
+    for line in stdin:
+        if not line.strip():
+            continue
+        ret, result = _handle(line, fix, check)
+        stdout.write(f'{json.dumps(result)}\n')
+        stdout.flush()
+        yield ret
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from typing import TYPE_CHECKING
+
+from pybreakingfix import _manifest
+from pybreakingfix._data import Message
+from pybreakingfix._data import Settings
+
+if TYPE_CHECKING:
+    import mmap
+    import sqlite3
+
+# (exit code, messages, new contents)
+CachedResult = tuple[int, list[Message], bytes | None]
+
+# evict least recently used results once they grow past this many bytes
+MAX_SIZE = 256 * 1024 * 1024
+# and least recently used stat fingerprints past this many paths
+MAX_STATS = 1_000_000
+# rough per-row overhead used when accounting for the cache size
+_ROW_SIZE = 128
+# number of writes to batch into a single transaction
+_COMMIT_EVERY = 256
+
+_SCHEMA = '''\
+CREATE TABLE IF NOT EXISTS stats (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    ret INTEGER NOT NULL,
+    messages TEXT NOT NULL,
+    new_contents BLOB,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+'''
+
+
+def default_cache_dir() -> str:
+    if 'PYBREAKINGFIX_CACHE_DIR' in os.environ:
+        return os.environ['PYBREAKINGFIX_CACHE_DIR']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache',
+    )
+    return os.path.join(cache_home, 'pybreakingfix')
+
+
+def _version() -> str:
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version('pybreakingfix')
+    except importlib.metadata.PackageNotFoundError:  # pragma: no cover
+        return 'unknown'
+
+
+def ruleset_key(settings: Settings) -> str:
+    """identify everything other than the file contents a result depends on
+
+    this is the package version, the settings and the plugin manifest --
+    the modification times of our own modules are included as well so that
+    editing a plugin in a development checkout invalidates the cache.  the
+    plugins are not imported for this: they may not be needed at all.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{_version()}\0{settings!r}\0'.encode())
+    manifest = (
+        _manifest.NODE_TYPE_MODULES,
+        _manifest.TRIGGER_MODULES,
+        _manifest.UNTRIGGERED_MODULES,
+    )
+    h.update(repr(manifest).encode())
+    package_dir = os.path.dirname(__file__)
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                path = os.path.join(dirpath, filename)
+                relpath = os.path.relpath(path, package_dir)
+                h.update(f'{relpath}:{os.stat(path).st_mtime_ns}\0'.encode())
+    return h.hexdigest()
+
+
+def content_digest(contents_bytes: bytes | mmap.mmap) -> str:
+    return hashlib.blake2b(contents_bytes, digest_size=16).hexdigest()
+
+
+class Cache:
+    """results of previous runs, keyed by content digest and ruleset
+
+    a stat fingerprint (size, mtime_ns, inode) of each path is recorded as
+    well so that unchanged files do not even need to be read.  the cache is
+    a sqlite database in WAL mode so several worker processes may use it at
+    the same time.
+    """
+
+    def __init__(self, db: sqlite3.Connection, ruleset: str) -> None:
+        self._db = db
+        self._ruleset = ruleset
+        self._used_stats: list[tuple[int, str]] = []
+        self._used_results: list[tuple[int, str]] = []
+        self._pending_writes = 0
+
+    @classmethod
+    def open(cls, directory: str, ruleset: str) -> Cache:
+        import sqlite3
+
+        os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(os.path.join(directory, 'cache.db'), timeout=30)
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_SCHEMA)
+        except sqlite3.Error:
+            db.close()
+            raise
+        return cls(db, ruleset)
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self._db.close()
+
+    def _key(self, digest: str) -> str:
+        return f'{self._ruleset}:{digest}'
+
+    def _flush(self) -> None:
+        with self._db:
+            self._db.executemany(
+                'UPDATE stats SET last_used = ? WHERE path = ?',
+                self._used_stats,
+            )
+            self._db.executemany(
+                'UPDATE results SET last_used = ? WHERE key = ?',
+                self._used_results,
+            )
+        self._used_stats.clear()
+        self._used_results.clear()
+        self._pending_writes = 0
+
+    def _written(self) -> None:
+        # commit in chunks: cheaper than a transaction per row while not
+        # holding the write lock (blocking other processes) for too long
+        self._pending_writes += 1
+        if self._pending_writes >= _COMMIT_EVERY:
+            self._flush()
+
+    def _get(self, key: str) -> CachedResult | None:
+        row = self._db.execute(
+            'SELECT ret, messages, new_contents FROM results WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        self._used_results.append((time.time_ns(), key))
+        ret, messages_json, new_contents = row
+        messages = [
+            Message(line, col, rule, severity, tuple(args))
+            for line, col, rule, severity, args in json.loads(messages_json)
+        ]
+        return ret, messages, new_contents
+
+    def get_by_stat(
+            self,
+            path: str,
+            st: os.stat_result,
+    ) -> CachedResult | None:
+        """fast path: the file has not been touched since it was last seen"""
+        row = self._db.execute(
+            'SELECT digest FROM stats '
+            'WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?',
+            (path, st.st_size, st.st_mtime_ns, st.st_ino),
+        ).fetchone()
+        if row is None:
+            return None
+        self._used_stats.append((time.time_ns(), path))
+        return self._get(self._key(row[0]))
+
+    def get(self, digest: str) -> CachedResult | None:
+        return self._get(self._key(digest))
+
+    def put(self, digest: str, result: CachedResult) -> None:
+        ret, messages, new_contents = result
+        messages_json = json.dumps(messages)
+        size = _ROW_SIZE + len(messages_json) + len(new_contents or b'')
+        self._db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                self._key(digest), ret, messages_json, new_contents,
+                size, time.time_ns(),
+            ),
+        )
+        self._written()
+
+    def put_stat(self, path: str, st: os.stat_result, digest: str) -> None:
+        self._db.execute(
+            'INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                path, st.st_size, st.st_mtime_ns, st.st_ino, digest,
+                time.time_ns(),
+            ),
+        )
+        self._written()
+
+    def evict(
+            self,
+            max_size: int = MAX_SIZE,
+            max_stats: int = MAX_STATS,
+    ) -> None:
+        """drop the least recently used entries to stay within the limits"""
+        self._flush()
+        with self._db:
+            self._db.execute(
+                'DELETE FROM stats WHERE path IN ('
+                '    SELECT path FROM stats ORDER BY last_used DESC '
+                '    LIMIT -1 OFFSET ?'
+                ')',
+                (max_stats,),
+            )
+
+            (size,), = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM results',
+            )
+            excess = size - max_size
+            to_delete = []
+            for key, size in self._db.execute(
+                    'SELECT key, size FROM results ORDER BY last_used',
+            ):
+                if excess <= 0:
+                    break
+                to_delete.append((key,))
+                excess -= size
+            self._db.executemany(
+                'DELETE FROM results WHERE key = ?', to_delete,
+            )
@@ -0,0 +1,259 @@
+"""the tokens of a large segment of a file, without a `Token` per token"""
+from __future__ import annotations
+
+import bisect
+import functools
+import itertools
+import re
+import tokenize
+from array import array
+from collections.abc import Iterator
+from typing import overload
+from typing import SupportsIndex
+
+from tokenize_rt import curly_escape
+from tokenize_rt import ESCAPED_NL
+from tokenize_rt import Token
+from tokenize_rt import UNIMPORTANT_WS
+
+from pybreakingfix._token_helpers import TokenIndex
+from pybreakingfix._token_helpers import Tokens
+
+# the names of the tokens, each stored once: a token's kind is its index here
+NAMES = tuple(
+    sorted({*tokenize.tok_name.values(), UNIMPORTANT_WS, ESCAPED_NL}),
+)
+_KINDS = {name: kind for kind, name in enumerate(NAMES)}
+_WS = _KINDS[UNIMPORTANT_WS]
+_NL = _KINDS[ESCAPED_NL]
+
+# `Token._make` without a python frame for each token
+_make_token = functools.partial(tuple.__new__, Token)
+
+# (as `tokenize_rt` splits whitespace at its escaped newlines)
+_ESCAPED_NL_RE = re.compile(r'\\(\n|\r\n|\r)')
+
+
+def _line_starts(text: str, start: int, end: int) -> array[int]:
+    """the offset of each line of `text[start:end]`, then `end`
+
+    lines end at `\\n` alone, as `tokenize_rt` reads them (`io.StringIO`).
+    """
+    ret = array('q', (start,))
+    pos = text.find('\n', start, end)
+    while pos != -1:
+        ret.append(pos + 1)
+        pos = text.find('\n', pos + 1, end)
+    if ret[-1] != end:
+        ret.append(end)
+    return ret
+
+
+def _tokens(
+        text: str,
+        start: int,
+        end: int,
+) -> Iterator[tuple[int, int, int, int]]:
+    """`(kind, offset in text, line, utf8_byte_offset)` of each token of
+    `text[start:end]`: the tokens `tokenize_rt.src_to_tokens` makes of it,
+    one at a time
+    """
+    line_starts = _line_starts(text, start, end)
+    lines = (text[a:b] for a, b in itertools.pairwise(line_starts))
+    readline = functools.partial(next, lines, '')
+
+    pos = start
+    last_line = 1
+    last_col = 0
+    end_offset = 0
+    for tok_type, tok_text, (sline, scol), (eline, ecol), line in (
+            tokenize.generate_tokens(readline)
+    ):
+        if sline > last_line:
+            newtok = text[pos:line_starts[sline - 1] + scol]
+            # a multiline unimportant whitespace may contain escaped newlines
+            while (match := _ESCAPED_NL_RE.search(newtok)) is not None:
+                ws = newtok[:match.start()]
+                if ws:
+                    yield _WS, pos, last_line, end_offset
+                    pos += len(ws)
+                    end_offset += len(ws.encode())
+                yield _NL, pos, last_line, end_offset
+                pos += match.end() - match.start()
+                newtok = newtok[match.end():]
+                end_offset = 0
+                last_line += 1
+            if newtok:
+                yield _WS, pos, sline, 0
+                pos += len(newtok)
+                end_offset = len(newtok.encode())
+            else:
+                end_offset = 0
+        elif scol > last_col:
+            newtok = line[last_col:scol]
+            yield _WS, pos, sline, end_offset
+            pos += len(newtok)
+            end_offset += len(newtok.encode())
+
+        tok_name = tokenize.tok_name[tok_type]
+        if tok_name in {'FSTRING_MIDDLE', 'TSTRING_MIDDLE'}:  # pragma: >=3.12 cover  # noqa: E501
+            if '{' in tok_text or '}' in tok_text:
+                new_tok_text = curly_escape(tok_text)
+                ecol += len(new_tok_text) - len(tok_text)
+                tok_text = new_tok_text
+
+        yield _KINDS[tok_name], pos, sline, end_offset
+        pos += len(tok_text)
+        last_line, last_col = eline, ecol
+        if sline != eline:
+            line_start = line_starts[last_line - 1]
+            end_offset = len(text[line_start:line_start + last_col].encode())
+        else:
+            end_offset += len(tok_text.encode())
+
+
+class _Rows:
+    """the tokens of a `CompactTokens` as plain tuples, for `TokenIndex`"""
+
+    def __init__(self, tokens: CompactTokens) -> None:
+        self._tokens = tokens
+
+    def __iter__(self) -> Iterator[tuple[str, str, int, int]]:
+        return self._tokens._rows()
+
+
+class CompactTokens(Tokens):
+    """`Tokens` of `text[start:end]` kept in parallel arrays
+
+    a list of `Token`s costs well over a hundred bytes a token (the tuple,
+    its source string and its integers), which for a large generated module
+    is many times the size of the file.  here a token is its kind (an index
+    into `NAMES`), where its source starts in `text` (which is referenced,
+    not copied), its line and its utf-8 column: 17 bytes.  the `Token`s are
+    made as they are looked at, the source sliced out of `text` then.
+
+    this is a drop-in for `Tokens` as far as plugins are concerned: indexing
+    (by position or slice), iteration, `len`, `tokens[i] = ...`, the edits
+    and `token_index`.  the tokens replaced in place are kept aside.  the
+    other list methods are not supported.
+    """
+
+    def __init__(
+            self,
+            text: str,
+            start: int = 0,
+            end: int | None = None,
+    ) -> None:
+        super().__init__()
+        if end is None:
+            end = len(text)
+        self._text = text
+        self._kinds = array('B')
+        self._starts = array('q')
+        self._lines = array('I')
+        self._cols = array('I')
+        self._replaced: dict[int, Token] = {}
+        self._replaced_order: list[int] | None = None
+
+        append_kind = self._kinds.append
+        append_start = self._starts.append
+        append_line = self._lines.append
+        append_col = self._cols.append
+        for kind, pos, line, col in _tokens(text, start, end):
+            append_kind(kind)
+            append_start(pos)
+            append_line(line)
+            append_col(col)
+        # (the source of token `i` is always `starts[i]:starts[i + 1]`)
+        append_start(end)
+
+    def _token(self, i: int) -> Token:
+        token = self._replaced.get(i)
+        if token is None:
+            starts = self._starts
+            token = Token(
+                NAMES[self._kinds[i]],
+                self._text[starts[i]:starts[i + 1]],
+                self._lines[i],
+                self._cols[i],
+            )
+        return token
+
+    def _position(self, i: SupportsIndex) -> int:
+        ret = i.__index__()
+        if ret < 0:
+            ret += len(self._kinds)
+        if not 0 <= ret < len(self._kinds):
+            raise IndexError('list index out of range')
+        return ret
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    @overload
+    def __getitem__(self, i: SupportsIndex) -> Token: ...
+    @overload
+    def __getitem__(self, i: slice) -> list[Token]: ...
+
+    def __getitem__(self, i: SupportsIndex | slice) -> Token | list[Token]:
+        if isinstance(i, slice):
+            return [self._token(j) for j in range(*i.indices(len(self)))]
+        else:
+            return self._token(self._position(i))
+
+    def _rows(self) -> Iterator[tuple[str, str, int, int]]:
+        """the tokens as plain tuples, much cheaper to make than `Token`s"""
+        starts = self._starts
+        srcs = map(
+            self._text.__getitem__,
+            map(slice, starts, itertools.islice(starts, 1, None)),
+        )
+        names = map(NAMES.__getitem__, self._kinds)
+        rows = zip(names, srcs, self._lines, self._cols)
+        if self._replaced:
+            return itertools.starmap(self._replaced.get, enumerate(rows))
+        else:
+            return rows
+
+    def __iter__(self) -> Iterator[Token]:
+        return map(_make_token, self._rows())
+
+    def __reversed__(self) -> Iterator[Token]:
+        return map(self._token, reversed(range(len(self))))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, list):
+            return list(self) == list(other)
+        else:
+            return NotImplemented
+
+    def __ne__(self, other: object) -> bool:
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+    @property
+    def token_index(self) -> TokenIndex:
+        if self._index is None:
+            self._index = TokenIndex(_Rows(self))
+        return self._index
+
+    def _store(self, i: int, token: Token) -> None:
+        self._replaced[self._position(i)] = token
+        self._replaced_order = None
+
+    def _srcs(self, start: int, end: int) -> Iterator[str]:
+        if self._replaced_order is None:
+            self._replaced_order = sorted(self._replaced)
+        order = self._replaced_order
+        starts = self._starts
+        # the stretches of untouched tokens are single slices of the text
+        for i in order[bisect.bisect_left(order, start):]:
+            if i >= end:
+                break
+            yield self._text[starts[start]:starts[i]]
+            yield self._replaced[i].src
+            start = i + 1
+        yield self._text[starts[start]:starts[end]]
@@ -0,0 +1,256 @@
+"""a resident server so repeated invocations skip interpreter / plugin startup
+
+the protocol is a single json request per connection: the client writes
+`{"argv": [...], "cwd": "...", "env": {...}, "stdin": "<base64>",
+"stamp": ...}` and shuts down its writing side, the server replies with
+`{"ret": ..., "stdout": "...", "stderr": "..."}` and closes the connection.
+a request the daemon declines (a run over many files, which is better spread
+over a pool of processes by the client) is closed without a reply, the client
+then runs it in process.
+"""
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import socket
+import sys
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Sequence
+
+from pybreakingfix._cache import default_cache_dir
+
+# seconds to wait for the daemon to accept a connection / to answer, before
+# running in process instead
+CONNECT_TIMEOUT = 1.
+RESPONSE_TIMEOUT = 60.
+
+
+# the environment variables a run depends on (the cache directory), which the
+# daemon takes from the client for the duration of its request
+_ENV_PREFIX = 'PYBREAKINGFIX_'
+_ENV_VARS = frozenset(('HOME', 'XDG_CACHE_HOME'))
+
+
+class Declined(Exception):
+    """the request is better run by the client itself"""
+
+
+def socket_path() -> str:
+    if 'PYBREAKINGFIX_DAEMON_SOCKET' in os.environ:
+        return os.environ['PYBREAKINGFIX_DAEMON_SOCKET']
+    return os.path.join(default_cache_dir(), 'daemon.sock')
+
+
+def _stamp() -> str:
+    # a daemon started from a different installation (or before an upgrade,
+    # or an edit of any of its modules) must not answer for this one
+    package = os.path.dirname(__file__)
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(package):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                relpath = os.path.relpath(path, package)
+                h.update(f'{relpath}:{st.st_mtime_ns}:{st.st_size}\n'.encode())
+    return h.hexdigest()
+
+
+def _env() -> dict[str, str]:
+    return {
+        k: v for k, v in os.environ.items()
+        if k.startswith(_ENV_PREFIX) or k in _ENV_VARS
+    }
+
+
+@contextlib.contextmanager
+def _environ(env: dict[str, str]) -> Generator[None, None, None]:
+    orig = _env()
+    for k in orig.keys() - env.keys():
+        del os.environ[k]
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for k in env.keys() - orig.keys():
+            del os.environ[k]
+        os.environ.update(orig)
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    chunks = []
+    while chunk := sock.recv(65536):
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def forward(argv: Sequence[str]) -> int | None:
+    """run `argv` in the daemon, `None` if it is not available"""
+    if not hasattr(socket, 'AF_UNIX'):  # pragma: win32 cover
+        return None
+
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            return None
+        sock.settimeout(RESPONSE_TIMEOUT)
+
+        stdin = sys.stdin.buffer.read() if '-' in argv else b''
+        request = {
+            'argv': list(argv),
+            'cwd': os.getcwd(),
+            'env': _env(),
+            'stdin': base64.b64encode(stdin).decode(),
+            'stamp': _stamp(),
+        }
+        try:
+            sock.sendall(json.dumps(request).encode())
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            response_bytes = b''
+        else:
+            try:
+                response_bytes = _recv_all(sock)
+            except TimeoutError:
+                # the daemon may still be working on it (rewriting files):
+                # running it again in process would race with it
+                from pybreakingfix._main import EXIT_FATAL
+
+                print(
+                    f'error: the daemon did not answer within '
+                    f'{RESPONSE_TIMEOUT:g}s, it may still be running this '
+                    f'request',
+                    file=sys.stderr,
+                )
+                return EXIT_FATAL
+            except OSError:
+                response_bytes = b''
+
+    # the daemon went away (or declined to answer for us): put back what we
+    # consumed from stdin so the request can be handled in process instead
+    if not response_bytes:
+        if stdin:
+            sys.stdin = io.TextIOWrapper(io.BytesIO(stdin))
+        return None
+
+    response = json.loads(response_bytes)
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['ret']
+
+
+def _handle(
+        request: dict[str, object],
+        run: Callable[[Sequence[str]], int],
+) -> dict[str, object] | None:
+    """run the request, `None` if `run` declines it"""
+    argv = request['argv']
+    cwd = request['cwd']
+    env = request['env']
+    stdin_b64 = request['stdin']
+    assert isinstance(argv, list) and isinstance(cwd, str)
+    assert isinstance(env, dict) and isinstance(stdin_b64, str)
+
+    stdin = io.TextIOWrapper(io.BytesIO(base64.b64decode(stdin_b64)))
+    stdout, stderr = io.StringIO(), io.StringIO()
+    orig_stdin, orig_cwd = sys.stdin, os.getcwd()
+    try:
+        sys.stdin = stdin
+        os.chdir(cwd)
+        with _environ(env), contextlib.redirect_stdout(stdout):
+            with contextlib.redirect_stderr(stderr):
+                try:
+                    ret = run(argv)
+                except Declined:
+                    return None
+                except SystemExit as e:
+                    if e.code is None or isinstance(e.code, int):
+                        ret = e.code or 0
+                    else:
+                        print(e.code, file=sys.stderr)
+                        ret = 1
+                except Exception:
+                    import traceback
+
+                    traceback.print_exc()
+                    ret = 1
+    finally:
+        sys.stdin = orig_stdin
+        os.chdir(orig_cwd)
+
+    return {
+        'ret': ret,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+    }
+
+
+def serve(path: str, run: Callable[[Sequence[str]], int]) -> int:
+    """serve requests on the unix socket `path` until interrupted
+
+    `run` may raise `Declined` (before writing anything) to leave a request
+    to the client.
+    """
+    if not hasattr(socket, 'AF_UNIX'):  # pragma: win32 cover
+        print('--daemon is not supported on this platform', file=sys.stderr)
+        return 1
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        try:
+            server.connect(path)
+        except OSError:  # nothing is listening there, remove a stale socket
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        else:
+            print(f'daemon already running on {path}', file=sys.stderr)
+            return 1
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    stamp = _stamp()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # only the current user may talk to the daemon
+        umask = os.umask(0o177)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen()
+        print(f'pybreakingfix daemon listening on {path}', file=sys.stderr)
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    try:
+                        request_bytes = _recv_all(conn)
+                        if not request_bytes:  # someone checking if we're up
+                            continue
+                        request = json.loads(request_bytes)
+                        if request['stamp'] != stamp:
+                            print('client changed, exiting', file=sys.stderr)
+                            return 0
+                        response = _handle(request, run)
+                        if response is None:
+                            continue
+                        conn.sendall(json.dumps(response).encode())
+                    except Exception:
+                        import traceback
+
+                        traceback.print_exc()
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
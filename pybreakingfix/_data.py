@@ -2,17 +2,28 @@ from __future__ import annotations
 
 import ast
 import collections
-import pkgutil
+import importlib
+import re
+import time
 from collections.abc import Callable
 from collections.abc import Iterable
+from collections.abc import Set as AbstractSet
+from typing import Any
 from typing import NamedTuple
 from typing import Protocol
+from typing import TYPE_CHECKING
 from typing import TypeVar
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
+from pybreakingfix import _manifest
+from pybreakingfix._timings import func_name
+from pybreakingfix._timings import Timings
 
-from pybreakingfix import _plugins
+if TYPE_CHECKING:
+    import mmap
+
+    from tokenize_rt import Offset
+
+    from pybreakingfix._token_helpers import Tokens  # noqa: F401 (a string)
 
 Version = tuple[int, ...]
 
@@ -20,17 +31,46 @@ Version = tuple[int, ...]
 class Settings(NamedTuple):
     min_version: Version = (3, 12)
     check_only: bool = False
+    # with `check_only`: a message for every fix, not only the first one
+    # which shows that the file changes
+    report_fixes: bool = True
+
+
+class Message(NamedTuple):
+    line: int
+    col: int
+    rule: str
+    severity: str
+    args: tuple[str, ...]
 
 
 class State(NamedTuple):
     settings: Settings
     from_imports: dict[str, set[str]]
+    messages: list[Message]
     in_annotation: bool = False
 
 
 AST_T = TypeVar('AST_T', bound=ast.AST)
-TokenFunc = Callable[[int, list[Token]], None]
-ASTFunc = Callable[[State, AST_T, ast.AST], Iterable[tuple[Offset, TokenFunc]]]
+# tokenize_rt is only imported once there is something to fix
+TokenFunc = Callable[[int, 'Tokens'], None]
+ASTFunc = Callable[
+    [State, AST_T, ast.AST],
+    Iterable[tuple['Offset', TokenFunc]],
+]
+
+
+class Fix(NamedTuple):
+    """a token callback, with the id of the rule it fixes for the reports"""
+    rule: str
+    func: TokenFunc
+
+    def __call__(self, i: int, tokens: Tokens) -> None:
+        self.func(i, tokens)
+
+    @property
+    def __wrapped__(self) -> TokenFunc:  # (for `func_name`)
+        return self.func
 
 RECORD_FROM_IMPORTS = frozenset((
     '__future__',
@@ -50,72 +90,383 @@ RECORD_FROM_IMPORTS = frozenset((
     'math',
 ))
 
+
+_REGISTERED: dict[type[ast.AST], list[ASTFunc[Any]]]
+_REGISTERED = collections.defaultdict(list)
+
+
+class _Funcs(dict[type[ast.AST], list[ASTFunc[Any]]]):
+    """the registered plugins for each AST node type
+
+    the plugin modules are imported (according to the static manifest) the
+    first time a node type is looked up
+    """
+
+    def __missing__(self, tp: type[ast.AST]) -> list[ASTFunc[Any]]:
+        for modname in _manifest.NODE_TYPE_MODULES.get(tp.__name__, ()):
+            importlib.import_module(modname)
+        ret = self[tp] = _REGISTERED[tp]
+        return ret
+
+
 FUNCS: ASTCallbackMapping  # python/mypy#17566
-FUNCS = collections.defaultdict(list)  # type: ignore[assignment]
+FUNCS = _Funcs()
+
+
+def _node_types(tp: type[ast.AST] = ast.AST) -> Iterable[type[ast.AST]]:
+    yield tp
+    for subclass in tp.__subclasses__():
+        yield from _node_types(subclass)
+
 
+def load_plugins() -> None:
+    """import the plugins for every AST node type up front
+
+    afterwards `FUNCS` is only ever read, so threads may share it
+    """
+    for tp in _node_types():
+        FUNCS[tp]
+
+
+# identifiers which must appear in a file for a plugin to do anything
+# (any one of them is enough), `None` means the plugin always has to run
+TRIGGERS: dict[ASTFunc[Any], frozenset[str] | None] = {}
+# plugins which report no messages and whose every callback changes the
+# source: in check mode they need no tokenizing, see `visit`
+DEFINITE: set[ASTFunc[Any]] = set()
+# the nodes without children which are held by the fields `visit` skips
+_LEAF_TYPES = (
+    ast.expr_context, ast.boolop, ast.operator, ast.unaryop, ast.cmpop,
+)
+
+
+def register(
+        tp: type[AST_T],
+        *,
+        triggers: Iterable[str] | None = None,
+        definite: bool = False,
+) -> Callable[[ASTFunc[AST_T]], ASTFunc[AST_T]]:
+    if issubclass(tp, _LEAF_TYPES):
+        raise TypeError(f'{tp.__name__} nodes are not visited')
 
-def register(tp: type[AST_T]) -> Callable[[ASTFunc[AST_T]], ASTFunc[AST_T]]:
     def register_decorator(func: ASTFunc[AST_T]) -> ASTFunc[AST_T]:
-        FUNCS[tp].append(func)
+        _REGISTERED[tp].append(func)
+        TRIGGERS[func] = None if triggers is None else frozenset(triggers)
+        if definite:
+            DEFINITE.add(func)
         return func
     return register_decorator
 
 
 class ASTCallbackMapping(Protocol):
     def __getitem__(self, tp: type[AST_T]) -> list[ASTFunc[AST_T]]: ...
+    def keys(self) -> Iterable[type[ast.AST]]: ...
+
+
+def _handled_types(funcs: ASTCallbackMapping) -> Iterable[type[ast.AST]]:
+    """the node types `funcs` may have plugins for"""
+    if isinstance(funcs, _Funcs):
+        # without importing the plugins for every node type
+        ret = {tp for tp, tp_funcs in _REGISTERED.items() if tp_funcs}
+        # (some only exist in later versions)
+        ret.update(
+            getattr(ast, name)
+            for name in _manifest.NODE_TYPE_MODULES
+            if hasattr(ast, name)
+        )
+        return ret
+    else:
+        return funcs.keys()
+
+
+def _timed(func: ASTFunc[AST_T], timings: Timings) -> ASTFunc[AST_T]:
+    name = func_name(func)
+
+    def timed_func(
+            state: State,
+            node: AST_T,
+            parent: ast.AST,
+    ) -> Iterable[tuple[Offset, TokenFunc]]:
+        t0 = time.perf_counter()
+        ret = list(func(state, node, parent))
+        timings.add_plugin(name, time.perf_counter() - t0)
+        return ret
+    return timed_func
+
+
+# fields which never hold a node to visit: plain values, or expression
+# contexts and operators (`_LEAF_TYPES`, no plugin can be registered for)
+_SKIPPED_FIELDS = frozenset((
+    'arg', 'asname', 'attr', 'conversion', 'ctx', 'id', 'is_async', 'kind',
+    'level', 'module', 'name', 'op', 'ops', 'simple', 'type_comment',
+    'type_ignores',
+))
+# the nodes found in the blocks of statements (and the blocks themselves)
+_STATEMENT_TYPES = (ast.mod, ast.stmt, ast.excepthandler, ast.match_case)
+# the fields of a statement holding the statements nested in it
+_BLOCK_FIELDS = frozenset(('body', 'orelse', 'finalbody', 'handlers', 'cases'))
+_ANNOTATION_FIELDS = frozenset(('annotation', 'returns'))
+
+
+def _fields(
+        tp: type[ast.AST],
+        statements_only: bool,
+) -> tuple[str, ...]:
+    """the fields of `tp` to visit, in reverse (the order they are pushed)"""
+    if statements_only:
+        if issubclass(tp, _STATEMENT_TYPES):
+            return tuple(
+                name for name in reversed(tp._fields) if name in _BLOCK_FIELDS
+            )
+        else:
+            return ()
+    elif tp in (ast.Constant, ast.MatchSingleton):  # a plain `value`
+        return ()
+    else:
+        return tuple(
+            name
+            for name in reversed(tp._fields)
+            if name not in _SKIPPED_FIELDS
+        )
+
+
+# node type -> the fields to visit, when the plugins look at any node or
+# only at statements (which are only found in the blocks of statements)
+_FIELDS = {tp: _fields(tp, False) for tp in _node_types()}
+_STATEMENT_FIELDS = {tp: _fields(tp, True) for tp in _node_types()}
+_ANNOTATED = frozenset(
+    tp for tp in _FIELDS if not _ANNOTATION_FIELDS.isdisjoint(tp._fields)
+)
+
+
+class _AnnotationMarker:
+    """pushed around an annotation: visiting it enters / leaves it"""
+
+    def __init__(self, depth: int) -> None:
+        self.depth = depth
+
+
+_ENTER_ANNOTATION = _AnnotationMarker(1)
+_LEAVE_ANNOTATION = _AnnotationMarker(-1)
+
+
+class _Entry(NamedTuple):
+    funcs: tuple[ASTFunc[Any], ...]
+    # the `DEFINITE` plugins, when their callbacks are collected apart
+    definite: tuple[ASTFunc[Any], ...]
+
+
+def _dispatch(
+        funcs: ASTCallbackMapping,
+        identifiers: AbstractSet[str] | None,
+        timings: Timings | None,
+        definite: bool,
+        indefinite_only: bool,
+) -> tuple[dict[type[Any], _Entry], dict[type[ast.AST], tuple[str, ...]]]:
+    """the plugins to run by node type, and the fields to visit
+
+    only the node types with plugins (or needing special treatment) have an
+    entry, it is never changed afterwards.  when the plugins are only for
+    statements, expressions are not even visited.  there are no entries at
+    all when no plugin is left to run.
+    """
+    plugins: dict[type[ast.AST], list[ASTFunc[Any]]] = {}
+    for tp in _handled_types(funcs):
+        for func in funcs[tp]:
+            triggers = TRIGGERS.get(func)
+            if (
+                    triggers is not None and
+                    identifiers is not None and
+                    identifiers.isdisjoint(triggers)
+            ):
+                continue
+            elif indefinite_only and func in DEFINITE:
+                continue
+            plugins.setdefault(tp, []).append(func)
+    if not plugins:
+        return {}, {}
+
+    def _entry_funcs(
+            tp_funcs: Iterable[ASTFunc[Any]],
+    ) -> tuple[ASTFunc[Any], ...]:
+        if timings is None:
+            return tuple(tp_funcs)
+        else:
+            return tuple(_timed(func, timings) for func in tp_funcs)
+
+    dispatch: dict[type[Any], _Entry] = {}
+    # the `from_imports` are recorded, and annotations tracked, regardless
+    for tp in {*plugins, ast.ImportFrom, *_ANNOTATED, _AnnotationMarker}:
+        tp_funcs = plugins.get(tp, [])
+        if definite:
+            dispatch[tp] = _Entry(
+                _entry_funcs(f for f in tp_funcs if f not in DEFINITE),
+                _entry_funcs(f for f in tp_funcs if f in DEFINITE),
+            )
+        else:
+            dispatch[tp] = _Entry(_entry_funcs(tp_funcs), ())
+
+    if all(issubclass(tp, _STATEMENT_TYPES) for tp in plugins):
+        return dispatch, _STATEMENT_FIELDS
+    else:
+        return dispatch, _FIELDS
 
 
 def visit(
         funcs: ASTCallbackMapping,
         tree: ast.Module,
         settings: Settings,
-) -> dict[Offset, list[TokenFunc]]:
-    initial_state = State(
+        *,
+        identifiers: AbstractSet[str] | None = None,
+        timings: Timings | None = None,
+        definite: list[tuple[Offset, TokenFunc]] | None = None,
+) -> tuple[dict[Offset, list[TokenFunc]], list[Message]]:
+    """run the plugins in `funcs` over `tree`
+
+    with `identifiers` (the trigger identifiers found in the file) only the
+    plugins triggered by them run, with `timings` the time spent in each
+    plugin is recorded
+
+    with `definite` the callbacks of the `DEFINITE` plugins are added to it
+    instead of being returned: any of them means the file changes.  unless
+    `settings.report_fixes`, those plugins stop at the first one, and so
+    does the whole traversal when no other plugin is left to run.
+
+    the traversal allocates nothing per node: the stack holds the parent and
+    the node side by side, the annotations are entered and left through
+    markers pushed around them, and nodes which cannot hold anything a
+    plugin looks at (names, constants, ...) are not pushed at all.
+    """
+    dispatch, fields = _dispatch(
+        funcs, identifiers, timings, definite is not None, False,
+    )
+
+    base_state = State(
         settings=settings,
         from_imports=collections.defaultdict(set),
+        messages=[],
     )
-
-    nodes: list[tuple[State, ast.AST, ast.AST]] = [(initial_state, tree, tree)]
+    annotation_state = base_state._replace(in_annotation=True)
+    state = base_state
+    annotations = 0
 
     ret = collections.defaultdict(list)
-    while nodes:
-        state, node, parent = nodes.pop()
-
+    stack: list[Any] = [tree, tree] if dispatch else []
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        node = pop()
+        parent = pop()
         tp = type(node)
-        for ast_func in funcs[tp]:
-            for offset, token_func in ast_func(state, node, parent):
-                ret[offset].append(token_func)
-
-        if (
-                isinstance(node, ast.ImportFrom) and
-                not node.level and
-                node.module in RECORD_FROM_IMPORTS
-        ):
-            state.from_imports[node.module].update(
-                name.name for name in node.names if not name.asname
-            )
 
-        for name in reversed(node._fields):
+        entry = dispatch.get(tp)
+        if entry is not None:
+            if tp is _AnnotationMarker:
+                annotations += node.depth
+                state = annotation_state if annotations else base_state
+                continue
+
+            for ast_func in entry.funcs:
+                for offset, token_func in ast_func(state, node, parent):
+                    ret[offset].append(token_func)
+            if entry.definite:
+                assert definite is not None
+                len_before = len(definite)
+                for ast_func in entry.definite:
+                    definite.extend(ast_func(state, node, parent))
+                if len(definite) > len_before and not settings.report_fixes:
+                    dispatch, fields = _dispatch(
+                        funcs, identifiers, timings, True, True,
+                    )
+                    if not dispatch:
+                        break
+
+            if tp is ast.ImportFrom:
+                if not node.level and node.module in RECORD_FROM_IMPORTS:
+                    state.from_imports[node.module].update(
+                        name.name for name in node.names if not name.asname
+                    )
+            elif tp in _ANNOTATED:
+                for name in fields[tp]:
+                    value = getattr(node, name)
+                    if isinstance(value, list):
+                        for child in reversed(value):
+                            push(node)
+                            push(child)
+                    elif value is None:
+                        pass
+                    elif name in _ANNOTATION_FIELDS:
+                        push(None)
+                        push(_LEAVE_ANNOTATION)
+                        push(node)
+                        push(value)
+                        push(None)
+                        push(_ENTER_ANNOTATION)
+                    else:
+                        push(node)
+                        push(value)
+                continue
+
+        for name in fields[tp]:
             value = getattr(node, name)
-            if name in {'annotation', 'returns'}:
-                next_state = state._replace(in_annotation=True)
+            if isinstance(value, list):
+                for child in reversed(value):
+                    child_tp = type(child)
+                    if fields.get(child_tp) or child_tp in dispatch:
+                        push(node)
+                        push(child)
             else:
-                next_state = state
-
-            if isinstance(value, ast.AST):
-                nodes.append((next_state, value, node))
-            elif isinstance(value, list):
-                for value in reversed(value):
-                    if isinstance(value, ast.AST):
-                        nodes.append((next_state, value, node))
-    return ret
+                child_tp = type(value)
+                if fields.get(child_tp) or child_tp in dispatch:
+                    push(node)
+                    push(value)
+    return ret, base_state.messages
 
 
 def _import_plugins() -> None:
+    """import every plugin module, regardless of the manifest"""
+    import pkgutil
+
+    from pybreakingfix import _plugins
+
     plugins_path = _plugins.__path__
     mod_infos = pkgutil.walk_packages(plugins_path, f'{_plugins.__name__}.')
     for _, name, _ in mod_infos:
         __import__(name, fromlist=['_trash'])
 
 
-_import_plugins()
+def _trigger_re() -> re.Pattern[bytes] | None:
+    if _manifest.UNTRIGGERED_MODULES:
+        return None
+
+    # longest first so that the alternation never stops at a prefix
+    alternatives = b'|'.join(
+        re.escape(word.encode())
+        for word in sorted(
+            _manifest.TRIGGER_MODULES,
+            key=lambda word: (-len(word), word),
+        )
+    )
+    return re.compile(rb'\b(?:' + alternatives + rb')\b')
+
+
+# single matcher for the trigger identifiers of every registered plugin, a
+# file which does not match cannot be changed (or reported) by any of them
+TRIGGER_RE = _trigger_re()
+
+
+def trigger_identifiers(
+        contents_bytes: bytes | mmap.mmap,
+) -> frozenset[str] | None:
+    """the trigger identifiers in a file, `None` if all plugins must run"""
+    if TRIGGER_RE is None:
+        return None
+
+    # one match at a time (not a list of them all, for large files), and no
+    # further than the first occurrence of the last trigger
+    ret: set[str] = set()
+    for match in TRIGGER_RE.finditer(contents_bytes):
+        ret.add(match[0].decode())
+        if len(ret) == len(_manifest.TRIGGER_MODULES):
+            break
+    return frozenset(ret)
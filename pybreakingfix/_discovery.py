@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
+from typing import NamedTuple
+
+INCLUDE_RE = re.compile(r'.*\.py\Z')
+
+DEFAULT_EXCLUDES = (
+    '.git',
+    '.hg',
+    '.svn',
+    '.tox',
+    '.nox',
+    '.venv',
+    'venv',
+    'build',
+    '__pycache__',
+)
+
+
+def compile_excludes(patterns: Iterable[str]) -> re.Pattern[str]:
+    """compile glob patterns into a single matcher
+
+    the patterns are matched against both the basename and the path relative
+    to the directory being walked
+    """
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+
+
+class _Pattern(NamedTuple):
+    regex: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+
+
+def _translate_gitignore(pattern: str) -> str:
+    # a slash anywhere but the end anchors the pattern to the directory of
+    # the .gitignore, otherwise it may match at any depth
+    anchored = '/' in pattern.rstrip('/')
+    pattern = pattern.strip('/')
+
+    ret = '' if anchored else '(?:.*/)?'
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            ret += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            ret += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            ret += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            ret += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = f'^{chars[1:]}'
+            ret += f'[{chars}]'
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            ret += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            ret += re.escape(pattern[i])
+            i += 1
+    return f'{ret}\\Z'
+
+
+class GitIgnore:
+    """the (common subset of) patterns from a single .gitignore file"""
+
+    def __init__(self, patterns: Sequence[_Pattern]) -> None:
+        self.patterns = patterns
+
+    @classmethod
+    def parse(cls, contents: str) -> GitIgnore:
+        patterns = []
+        for line in contents.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            patterns.append(
+                _Pattern(
+                    regex=re.compile(_translate_gitignore(line)),
+                    negate=negate,
+                    dir_only=line.endswith('/'),
+                ),
+            )
+        return cls(patterns)
+
+    @classmethod
+    def load(cls, directory: str) -> GitIgnore | None:
+        try:
+            with open(os.path.join(directory, '.gitignore')) as f:
+                return cls.parse(f.read())
+        except OSError:
+            return None
+
+    def match(self, relpath: str, is_dir: bool) -> bool | None:
+        """whether `relpath` is ignored, `None` if no pattern applies"""
+        # the last matching pattern wins
+        for pattern in reversed(self.patterns):
+            if pattern.dir_only and not is_dir:
+                continue
+            if pattern.regex.match(relpath):
+                return not pattern.negate
+        return None
+
+
+def _is_ignored(
+        path: str,
+        is_dir: bool,
+        gitignores: list[tuple[str, GitIgnore]],
+) -> bool:
+    # the deepest .gitignore takes precedence
+    for base, gitignore in reversed(gitignores):
+        relpath = path[len(base) + 1:].replace(os.sep, '/')
+        ret = gitignore.match(relpath, is_dir)
+        if ret is not None:
+            return ret
+    return False
+
+
+def _walk(root: str, exclude: re.Pattern[str]) -> Iterator[str]:
+    # a stack of the entries left in each directory so files are produced
+    # while walking.  each directory's entries are sorted by name so the
+    # order (of the output, and of the batches of --jobs) is the same on
+    # every platform and file system
+    gitignores: list[tuple[str, GitIgnore]] = []
+    stack: list[tuple[str, Iterator[os.DirEntry[str]], bool]] = []
+
+    def _push(directory: str) -> None:
+        gitignore = GitIgnore.load(directory)
+        if gitignore is not None:
+            gitignores.append((directory, gitignore))
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        stack.append((directory, iter(entries), gitignore is not None))
+
+    _push(root)
+    while stack:
+        _, entries, has_gitignore = stack[-1]
+        for entry in entries:
+            relpath = entry.path[len(root) + 1:].replace(os.sep, '/')
+            if exclude.match(entry.name) or exclude.match(relpath):
+                continue
+
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if _is_ignored(entry.path, is_dir, gitignores):
+                continue
+            elif is_dir:
+                _push(entry.path)
+                break
+            elif INCLUDE_RE.match(entry.name) and entry.is_file():
+                yield entry.path
+        else:
+            stack.pop()
+            if has_gitignore:
+                gitignores.pop()
+
+
+def expand_paths(
+        paths: Iterable[str],
+        exclude: re.Pattern[str],
+) -> Iterator[str]:
+    """lazily expand directories into the python files they contain
+
+    explicitly listed files (and `-`) are always passed through as-is
+    """
+    for path in paths:
+        if path != '-' and os.path.isdir(path):
+            yield from _walk(os.path.normpath(path), exclude)
+        else:
+            yield path
+
+
+def _git(*cmd: str) -> list[str]:
+    import subprocess
+
+    out = subprocess.run(('git', *cmd), capture_output=True, check=True).stdout
+    return [os.fsdecode(path) for path in out.split(b'\0') if path]
+
+
+def git_changed_files(ref: str) -> list[str]:
+    """python files added or modified relative to `ref`
+
+    this includes staged and unstaged changes as well as untracked files (but
+    not ignored ones), the paths are relative to the current directory.
+    """
+    toplevel, = _git('rev-parse', '--show-toplevel')
+    toplevel = toplevel.rstrip('\n')
+    changed = _git(
+        '-C', toplevel, 'diff', '--name-only', '--no-renames',
+        '--diff-filter=AM', '-z', ref, '--',
+    )
+    untracked = _git(
+        '-C', toplevel, 'ls-files', '--others', '--exclude-standard', '-z',
+    )
+    return sorted(
+        os.path.relpath(os.path.join(toplevel, path))
+        for path in dict.fromkeys((*changed, *untracked))
+        if INCLUDE_RE.match(path)
+    )
+
+
+def filter_paths(
+        paths: Iterable[str],
+        within: Sequence[str],
+        exclude: re.Pattern[str],
+) -> Iterator[str]:
+    """the `paths` inside any of `within` (all if empty) not excluded"""
+    within = [os.path.abspath(path) for path in within]
+    for path in paths:
+        abspath = os.path.abspath(path)
+        if within and not any(
+                abspath == root or abspath.startswith(root + os.sep)
+                for root in within
+        ):
+            continue
+        elif (
+                exclude.match(path.replace(os.sep, '/')) or
+                any(exclude.match(part) for part in path.split(os.sep))
+        ):
+            continue
+        else:
+            yield path
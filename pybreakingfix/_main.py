@@ -1,56 +1,98 @@
 from __future__ import annotations
 
-import argparse
-import ast
+import bisect
+import collections
+import contextlib
+import functools
+import itertools
+import operator
+import os
+import re
 import sys
-import tokenize
+import time
+from collections.abc import Generator
+from collections.abc import Iterable
+from collections.abc import Iterator
 from collections.abc import Sequence
+from typing import NamedTuple
+from typing import TYPE_CHECKING
 
-from tokenize_rt import reversed_enumerate
-from tokenize_rt import src_to_tokens
-from tokenize_rt import Token
-from tokenize_rt import tokens_to_src
-from tokenize_rt import UNIMPORTANT_WS
-
-from pybreakingfix._ast_helpers import ast_parse
+from pybreakingfix import _daemon
+from pybreakingfix._cache import Cache
+from pybreakingfix._cache import content_digest
+from pybreakingfix._cache import default_cache_dir
+from pybreakingfix._cache import ruleset_key
+from pybreakingfix._data import Fix
 from pybreakingfix._data import FUNCS
+from pybreakingfix._data import load_plugins
+from pybreakingfix._data import Message
 from pybreakingfix._data import Settings
+from pybreakingfix._data import TokenFunc
+from pybreakingfix._data import TRIGGER_RE
+from pybreakingfix._data import trigger_identifiers
 from pybreakingfix._data import visit
-from pybreakingfix._plugins import imports as imports_plugin
+from pybreakingfix._discovery import compile_excludes
+from pybreakingfix._discovery import DEFAULT_EXCLUDES
+from pybreakingfix._discovery import expand_paths
+from pybreakingfix._discovery import filter_paths
+from pybreakingfix._discovery import git_changed_files
+from pybreakingfix._reporters import message_text
+from pybreakingfix._timings import func_name
+from pybreakingfix._timings import Timings
+
+# only what every invocation needs is imported up front: the daemon client
+# and files without anything to fix never pay for tokenizing (or a pool)
+if TYPE_CHECKING:
+    import argparse
+    import mmap
+
+    from tokenize_rt import Offset
+    from tokenize_rt import Token
+
+    from pybreakingfix._ast_helpers import Statement
+    from pybreakingfix._token_helpers import Tokens
 
 # Exit codes
 EXIT_OK = 0
 EXIT_CHANGES = 1
 EXIT_FATAL = 2
 
+# Number of files sent to a worker process at a time
+BATCH_SIZE = 16
+
+# --fail-fast / --fail-fast-on-changes -> the exit statuses to stop at
+FAIL_FAST = {
+    'fatal': frozenset((EXIT_FATAL,)),
+    'changes': frozenset((EXIT_FATAL, EXIT_CHANGES)),
+}
+
+# Files at least this large are memory-mapped rather than read
+MMAP_THRESHOLD = 1024 * 1024
+# and are examined in chunks of this size rather than all at once
+CHUNK_SIZE = 1024 * 1024
+# Segments at least this long are tokenized into `CompactTokens`
+COMPACT_TOKENS_THRESHOLD = 256 * 1024
+
+# the offset of a token as a plain tuple, much cheaper than `Token.offset`
+_token_offset = operator.attrgetter('line', 'utf8_byte_offset')
+_message_line = operator.attrgetter('line')
+
+# before 3.12 an f-string is a single token: what is inside one is never
+# fixed, so its fixes are not certain (see `_fix_contents`)
+_FSTRING_RE = (
+    re.compile(rb'''(?<!\w)(?:[rR]?[fF]|[fF][rR])['"]''')
+    if sys.version_info < (3, 12) else
+    None
+)
+
+# the end of a line, as far as the tokenizer is concerned
+_EOL_RE = re.compile(r'\r\n?|\n')
+
 # ANSI color codes
 YELLOW = '\033[93m'
 RED = '\033[91m'
 RESET = '\033[0m'
 
-# Removed modules that require manual migration
-REMOVED_MODULES = {
-    'distutils': 'Use setuptools instead',
-    'asynchat': 'Use asyncio instead',
-    'asyncore': 'Use asyncio instead',
-    'smtpd': 'Use aiosmtpd package instead',
-    'imp': 'Use importlib instead',
-}
-
-# Potentially deprecated methods that we cannot auto-fix
-# because we cannot determine object types statically
-# Format: method_name -> (deprecated_type, replacement, safe_type)
-# - deprecated_type: the type where this method is deprecated
-# - replacement: what to use instead
-# - safe_type: type where this method is still valid (optional)
-POTENTIAL_DEPRECATED_METHODS = {
-    'tostring': ('array.array', '.tobytes()', 'etree'),
-    'fromstring': ('array.array', '.frombytes()', 'etree'),
-    'isAlive': ('threading.Thread', '.is_alive()', ''),
-    'getchildren': ('xml.etree.Element', 'list(element)', ''),
-    'getiterator': ('xml.etree.Element', 'element.iter()', ''),
-}
-
 
 def _fixup_dedent_tokens(tokens: list[Token]) -> None:
     """For whatever reason the DEDENT / UNIMPORTANT_WS tokens are misordered
@@ -62,190 +104,745 @@ def _fixup_dedent_tokens(tokens: list[Token]) -> None:
     |^    ^- DEDENT
     |+----UNIMPORTANT_WS
     """
+    from tokenize_rt import UNIMPORTANT_WS
+
     for i, token in enumerate(tokens):
         if token.name == UNIMPORTANT_WS and tokens[i + 1].name == 'DEDENT':
             tokens[i], tokens[i + 1] = tokens[i + 1], tokens[i]
 
 
-def _fix_plugins(contents_text: str, settings: Settings) -> str:
-    # Clear pending ABC imports from previous file
-    imports_plugin.pending_abc_imports.clear()
+def _is_ascii(contents_bytes: bytes | mmap.mmap) -> bool:
+    if isinstance(contents_bytes, bytes):
+        return contents_bytes.isascii()
+    return all(
+        contents_bytes[i:i + CHUNK_SIZE].isascii()
+        for i in range(0, len(contents_bytes), CHUNK_SIZE)
+    )
 
+
+def _is_utf8(contents_bytes: bytes | mmap.mmap) -> bool:
+    """Check the encoding without holding a decoded copy of the file."""
+    import codecs
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
     try:
-        ast_obj = ast_parse(contents_text)
-    except SyntaxError:
-        return contents_text
+        for i in range(0, len(contents_bytes), CHUNK_SIZE):
+            # (a slice of all of a small `bytes` is the same object)
+            chunk = contents_bytes[i:i + CHUNK_SIZE]
+            if not chunk.isascii() or decoder.getstate()[0]:
+                decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    else:
+        return True
 
-    callbacks = visit(FUNCS, ast_obj, settings)
 
-    if not callbacks:
-        return contents_text
+@contextlib.contextmanager
+def _open_contents(filename: str) -> Iterator[bytes | mmap.mmap]:
+    """The contents of a file, memory-mapped if it is large."""
+    with open(filename, 'rb') as fb:
+        size = os.fstat(fb.fileno()).st_size
+        # (an empty file cannot be mapped)
+        if size < MMAP_THRESHOLD or not size:
+            yield fb.read()
+        else:
+            import mmap
+
+            with mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                yield m
+
+
+def _has_triggers(contents_bytes: bytes) -> bool:
+    """Whether any plugin could possibly match something in this file."""
+    return TRIGGER_RE is None or TRIGGER_RE.search(contents_bytes) is not None
+
+
+def _visit_src(
+        contents: str | bytes | mmap.mmap,
+        settings: Settings,
+        identifiers: frozenset[str] | None = None,
+        timings: Timings | None = None,
+        statements: dict[Offset, Statement | None] | None = None,
+        definite: list[tuple[Offset, TokenFunc]] | None = None,
+) -> tuple[dict[Offset, list[TokenFunc]], list[Message]]:
+    """Parse once and run the triggered plugins in a single traversal.
+
+    This produces both the token callbacks and the diagnostics (removed
+    modules, potentially deprecated methods) for the file.  `identifiers`
+    are the trigger identifiers in the file, if they are already known.
+    The (undecoded) contents of a file are parsed without being copied.
+
+    With `statements` the innermost statement enclosing each offset with
+    callbacks is added to it, so that only they need to be tokenized.
+    """
+    from pybreakingfix._ast_helpers import ast_parse
+    from pybreakingfix._ast_helpers import enclosing_statements
 
     try:
-        tokens = src_to_tokens(contents_text)
-    except tokenize.TokenError:  # pragma: no cover (bpo-2180)
-        return contents_text
+        ast_obj = ast_parse(contents)
+    except SyntaxError:
+        return {}, []
+    finally:
+        if timings is not None:
+            timings.lap('parse')
 
-    _fixup_dedent_tokens(tokens)
+    if identifiers is None:
+        if isinstance(contents, str):
+            contents = contents.encode()
+        identifiers = trigger_identifiers(contents)
+    callbacks, messages = visit(
+        FUNCS, ast_obj, settings,
+        identifiers=identifiers, timings=timings, definite=definite,
+    )
+    if statements is not None:
+        statements.update(enclosing_statements(ast_obj, callbacks))
+    if timings is not None:
+        timings.lap('visit')
+    return callbacks, messages
 
-    for i, token in reversed_enumerate(tokens):
-        if not token.src:
-            continue
-        # though this is a defaultdict, by using `.get()` this function's
-        # self time is almost 50% faster
-        for callback in callbacks.get(token.offset, ()):
-            callback(i, tokens)
 
-    result = tokens_to_src(tokens).lstrip()
+def _callback_positions(
+        tokens: Sequence[Token],
+        callbacks: dict[Offset, list[TokenFunc]],
+) -> list[tuple[int, list[TokenFunc]]]:
+    """Find the token index of each offset with callbacks, in order.
 
-    # Add imports for collections.abc ABCs if needed
-    if imports_plugin.pending_abc_imports:
-        abc_names = sorted(imports_plugin.pending_abc_imports)
-        import_line = f'from collections.abc import {", ".join(abc_names)}\n'
-        # Insert at the beginning (after any existing imports will be handled by lstrip)
-        result = import_line + result
+    The tokens are sorted by offset so each one is found by bisection: this
+    takes time proportional to the number of callbacks, not of tokens.
+    """
+    ret = []
+    lo = 0
+    for offset in sorted(callbacks):
+        i = bisect.bisect_left(tokens, offset, lo=lo, key=_token_offset)
+        # zero width tokens (DEDENT, ...) share the offset of the next one
+        while i < len(tokens) and not tokens[i].src:
+            i += 1
+        if i < len(tokens) and _token_offset(tokens[i]) == offset:
+            ret.append((i, callbacks[offset]))
+        lo = i
+    return ret
 
-    return result
 
+def _fix_rule(callback: TokenFunc) -> str:
+    """the rule id of a fix: the `rule` of a `Fix`, else the name of the
+    callback (`_fix_fstring_format` -> `fstring-format`)
+    """
+    if isinstance(callback, Fix):
+        return callback.rule
+    else:
+        name = func_name(callback).rpartition('.')[2]
+        return name.removeprefix('_fix_').replace('_', '-')
+
+
+def _run_callbacks_timed(
+        positions: list[tuple[int, list[TokenFunc]]],
+        tokens: Tokens,
+        timings: Timings,
+) -> None:
+    for i, funcs in reversed(positions):
+        for callback in funcs:
+            t0 = time.perf_counter()
+            callback(i, tokens)
+            timings.add_plugin(func_name(callback), time.perf_counter() - t0)
 
-def _check_removed_modules(contents_text: str) -> list[tuple[int, str, str]]:
-    """Check for imports of removed modules.
 
-    Returns list of (line_number, module_name, suggestion).
+def _segments(
+        contents_text: str,
+        statements: dict[Offset, Statement | None] | None,
+) -> list[tuple[int, int, int]]:
+    """The parts of the text to tokenize: `(start, end, lines before it)`.
+
+    For each offset with callbacks this is the innermost statement (or
+    statement header) containing it which begins a line of its own, merged
+    where they overlap.  The whole text if there is no such statement for
+    some offset, or no `statements` at all.
     """
-    errors = []
+    whole = [(0, len(contents_text), 0)]
+    if statements is None:
+        return whole
+
+    line_starts = [0]
+    line_starts.extend(m.end() for m in _EOL_RE.finditer(contents_text))
+    line_starts.append(len(contents_text))
+
+    ranges = []
+    for statement in statements.values():
+        while statement is not None:
+            line_start = line_starts[statement.start_line - 1]
+            # not `x = (1,\n2); y = 3`, nor a continuation of a string
+            before = contents_text[line_start:line_start + statement.start_col]
+            if before.strip() in ('', '@'):
+                ranges.append((statement.start_line, statement.end_line))
+                break
+            statement = statement.parent
+        else:
+            return whole
+    ranges.sort()
+
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    # (the end of the last line is the end of the text)
+    last = len(line_starts) - 1
+    return [
+        (line_starts[start - 1], line_starts[min(end, last)], start - 1)
+        for start, end in merged
+    ]
+
+
+def _tokenize(
+        contents_text: str,
+        segments: list[tuple[int, int, int]],
+) -> list[Tokens] | None:
+    import tokenize
+
+    from tokenize_rt import src_to_tokens
+
+    from pybreakingfix._compact_tokens import CompactTokens
+    from pybreakingfix._token_helpers import Tokens
+
     try:
-        tree = ast_parse(contents_text)
-    except SyntaxError:
-        return errors
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                mod_name = alias.name.split('.')[0]
-                if mod_name in REMOVED_MODULES:
-                    errors.append((
-                        node.lineno,
-                        mod_name,
-                        REMOVED_MODULES[mod_name],
-                    ))
-        elif isinstance(node, ast.ImportFrom):
-            if node.module:
-                mod_name = node.module.split('.')[0]
-                if mod_name in REMOVED_MODULES:
-                    errors.append((
-                        node.lineno,
-                        mod_name,
-                        REMOVED_MODULES[mod_name],
-                    ))
-
-    return errors
-
-
-def _check_potential_deprecated_methods(
+        return [
+            CompactTokens(contents_text, start, end)
+            if end - start >= COMPACT_TOKENS_THRESHOLD else
+            Tokens(src_to_tokens(contents_text[start:end]))
+            for start, end, _ in segments
+        ]
+    except (tokenize.TokenError, IndentationError):
+        return None
+
+
+def _apply_callbacks(
         contents_text: str,
-) -> list[tuple[int, str, str, str, str]]:
-    """Check for potentially deprecated method calls.
+        callbacks: dict[Offset, list[TokenFunc]],
+        timings: Timings | None = None,
+        fixes: list[Message] | None = None,
+        statements: dict[Offset, Statement | None] | None = None,
+) -> str:
+    """Run the token callbacks, returning the fixed source.
 
-    Returns list of (line_number, method_name, deprecated_type, replacement, safe_type).
-    These are methods we cannot auto-fix because we cannot determine
-    object types statically.
+    With `fixes` a message for each callback which ran is added to it.
+    With `statements` (see `_visit_src`) only the statements containing
+    callbacks are tokenized and rewritten, rather than the whole text: the
+    cost is proportional to the number of fixes instead of to the size of
+    the file.
     """
-    warnings = []
+    from tokenize_rt import Offset
+
+    if not callbacks:
+        return contents_text
+
+    whole = _segments(contents_text, None)
+    segments = _segments(contents_text, statements)
+    segment_tokens = _tokenize(contents_text, segments)
+    if segment_tokens is None and segments != whole:
+        # a statement not ending its line after all: `x = 1; y = (\n2)`
+        segments = whole
+        segment_tokens = _tokenize(contents_text, segments)
+    if timings is not None:
+        timings.lap('tokenize')
+    if segment_tokens is None:  # pragma: no cover (bpo-2180)
+        return contents_text
+
+    # the callbacks of each segment, at offsets relative to it
+    lines_before = [lines for _, _, lines in segments]
+    segment_callbacks: list[dict[Offset, list[TokenFunc]]]
+    segment_callbacks = [{} for _ in segments]
+    for (line, col), funcs in callbacks.items():
+        k = bisect.bisect_left(lines_before, line) - 1
+        segment_callbacks[k][Offset(line - lines_before[k], col)] = funcs
+
+    # before the DEDENT fixup, while the tokens are still in offset order
+    segment_positions = [
+        _callback_positions(tokens, segment_callbacks[k])
+        for k, tokens in enumerate(segment_tokens)
+    ]
+    if timings is not None:
+        timings.lap('positions')
+
+    for tokens in segment_tokens:
+        _fixup_dedent_tokens(tokens)
+    if timings is not None:
+        timings.lap('fixup dedent')
+
+    # from the end, an edit never moves a position yet to come
+    for tokens, positions in zip(segment_tokens, segment_positions):
+        if timings is None:
+            for i, funcs in reversed(positions):
+                for callback in funcs:
+                    callback(i, tokens)
+        else:
+            _run_callbacks_timed(positions, tokens, timings)
+    if timings is not None:
+        timings.lap('callbacks')
+
+    if fixes is not None:
+        for tokens, positions, lines in zip(
+                segment_tokens, segment_positions, lines_before,
+        ):
+            for i, funcs in positions:
+                token = tokens[i]
+                fixes.extend(
+                    Message(
+                        line=(token.line or 0) + lines,
+                        col=token.utf8_byte_offset or 0,
+                        rule=_fix_rule(callback),
+                        severity='fix',
+                        args=(),
+                    )
+                    for callback in funcs
+                )
+
+    parts = []
+    pos = 0
+    imports: dict[str, set[str]] = collections.defaultdict(set)
+    for (start, end, _), tokens in zip(segments, segment_tokens):
+        parts.append(contents_text[pos:start])
+        parts.append(tokens.src())
+        pos = end
+        for module, names in tokens.imports.items():
+            imports[module].update(names)
+    parts.append(contents_text[pos:])
+    result = ''.join(parts).lstrip()
+
+    # Add the imports needed by the fixes (for example collections.abc ABCs)
+    import_lines = ''.join(
+        f'from {module} import {", ".join(sorted(names))}\n'
+        for module, names in sorted(imports.items())
+    )
+    if timings is not None:
+        timings.lap('src')
+    return import_lines + result
+
+
+def _fix_plugins(contents_text: str, settings: Settings) -> str:
+    statements: dict[Offset, Statement | None] = {}
+    callbacks, _ = _visit_src(
+        contents_text, settings, statements=statements,
+    )
+    return _apply_callbacks(contents_text, callbacks, statements=statements)
+
+
+def _format_message(filename: str, msg: Message) -> str:
+    if msg.severity == 'error':
+        color, label = RED, 'ERROR'
+    else:
+        color, label = YELLOW, 'WARNING'
+    return (
+        f'{color}{filename}:{msg.line}: {label}: {message_text(msg)}{RESET}'
+    )
+
+
+class FileResult(NamedTuple):
+    ret: int
+    messages: list[Message]
+    # the rewritten file contents, only set when they changed -- with
+    # `Settings.check_only` they are not kept, only `b''` says so
+    new_contents: bytes | None = None
+
+
+def _fix_contents(
+        contents_bytes: bytes | mmap.mmap,
+        settings: Settings,
+        timings: Timings | None = None,
+) -> FileResult:
+    """Fix the contents of a file.
+
+    They are only decoded if there is something to rewrite: until then the
+    bytes (possibly memory-mapped) are used as they are.
+
+    In check mode a callback which certainly changes the source is enough
+    to know the answer: then nothing is tokenized or rewritten at all.  Not
+    before python 3.12 in a file with f-strings, where a callback inside
+    one would never run.
+    """
+    identifiers = trigger_identifiers(contents_bytes)
+    triggered = identifiers is None or bool(identifiers)
+    if timings is not None:
+        timings.lap('prescreen')
+    # ascii is always valid utf-8 so there is nothing left to check
+    if not triggered and _is_ascii(contents_bytes):
+        return FileResult(EXIT_OK, [])
+
+    is_utf8 = _is_utf8(contents_bytes)
+    if timings is not None:
+        timings.lap('decode')
+    if not is_utf8:
+        msg = Message(
+            line=0, col=0, rule='non-utf-8', severity='error', args=(),
+        )
+        return FileResult(EXIT_CHANGES, [msg])
+
+    if not triggered:
+        return FileResult(EXIT_OK, [])
+
+    statements: dict[Offset, Statement | None] = {}
+    definite: list[tuple[Offset, TokenFunc]] | None
+    if settings.check_only and (
+            _FSTRING_RE is None or _FSTRING_RE.search(contents_bytes) is None
+    ):
+        definite = []
+    else:
+        definite = None
+    callbacks, messages = _visit_src(
+        contents_bytes, settings, identifiers, timings, statements, definite,
+    )
+
+    # Removed modules are fatal, report them before doing any rewriting
+    errors = [msg for msg in messages if msg.severity == 'error']
+    if errors:
+        return FileResult(EXIT_FATAL, errors)
+
+    if definite:
+        fixes = [
+            Message(
+                line=offset.line,
+                col=offset.utf8_byte_offset,
+                rule=_fix_rule(callback),
+                severity='fix',
+                args=(),
+            )
+            for offset, callback in definite
+        ]
+        messages = sorted([*messages, *fixes], key=_message_line)
+        return FileResult(EXIT_CHANGES, messages, b'')
+
+    if not callbacks:
+        return FileResult(EXIT_OK, messages)
+
+    contents_text = str(contents_bytes, 'UTF-8')
+    if timings is not None:
+        timings.lap('decode')
+
+    from pybreakingfix._token_helpers import OverlappingEditsError
+
+    fixes: list[Message] = []
     try:
-        tree = ast_parse(contents_text)
-    except SyntaxError:
-        return warnings
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call):
-            if isinstance(node.func, ast.Attribute):
-                method_name = node.func.attr
-                if method_name in POTENTIAL_DEPRECATED_METHODS:
-                    # Skip if it's a known safe module call (e.g., etree.tostring)
-                    if isinstance(node.func.value, ast.Name):
-                        caller = node.func.value.id
-                        # etree.tostring, etree.fromstring are valid
-                        if caller in ('etree', 'ET', 'ElementTree'):
-                            if method_name in ('tostring', 'fromstring'):
-                                continue
-
-                    deprecated_type, replacement, safe_type = POTENTIAL_DEPRECATED_METHODS[method_name]
-                    warnings.append((
-                        node.lineno,
-                        method_name,
-                        deprecated_type,
-                        replacement,
-                        safe_type,
-                    ))
-
-    return warnings
-
-
-def _fix_file(filename: str, args: argparse.Namespace) -> int:
-    if filename == '-':
-        contents_bytes = sys.stdin.buffer.read()
+        new_contents = _apply_callbacks(
+            contents_text, callbacks, timings, fixes, statements,
+        )
+    except OverlappingEditsError as e:
+        # two fixes disagree on a part of the file: it cannot be fixed
+        msg = Message(
+            line=0, col=0, rule='overlapping-edits', severity='error',
+            args=(str(e),),
+        )
+        return FileResult(EXIT_FATAL, [*messages, msg])
+    if new_contents == contents_text:
+        return FileResult(EXIT_OK, messages)
     else:
-        with open(filename, 'rb') as fb:
-            contents_bytes = fb.read()
+        messages = sorted([*messages, *fixes], key=_message_line)
+        if settings.check_only:
+            return FileResult(EXIT_CHANGES, messages, b'')
+        else:
+            return FileResult(EXIT_CHANGES, messages, new_contents.encode())
+
+
+def _fix_file(
+        filename: str,
+        settings: Settings,
+        cache: Cache | None = None,
+        timings: Timings | None = None,
+) -> FileResult:
+    if timings is None:
+        return _fix_file_impl(filename, settings, cache, None)
+
+    t0 = time.perf_counter()
+    timings.start()
+    result = _fix_file_impl(filename, settings, cache, timings)
+    timings.add_file(filename, time.perf_counter() - t0)
+    return result
+
+
+def _fix_file_impl(
+        filename: str,
+        settings: Settings,
+        cache: Cache | None,
+        timings: Timings | None,
+) -> FileResult:
+    if cache is None:
+        with _open_contents(filename) as contents_bytes:
+            if timings is not None:
+                timings.lap('read')
+            return _fix_contents(contents_bytes, settings, timings)
+
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    cached = cache.get_by_stat(path, st)
+    if timings is not None:
+        timings.lap('cache')
+    if cached is not None:
+        return FileResult(*cached)
+
+    with _open_contents(filename) as contents_bytes:
+        if timings is not None:
+            timings.lap('read')
+        digest = content_digest(contents_bytes)
+        result = _fix_contents_cached(
+            contents_bytes, settings, cache, digest, timings,
+        )
+    cache.put_stat(path, st, digest)
+    if timings is not None:
+        timings.lap('cache')
+    return result
+
+
+def _fix_contents_cached(
+        contents_bytes: bytes | mmap.mmap,
+        settings: Settings,
+        cache: Cache | None,
+        digest: str | None = None,
+        timings: Timings | None = None,
+) -> FileResult:
+    if cache is None:
+        return _fix_contents(contents_bytes, settings, timings)
+
+    if digest is None:
+        digest = content_digest(contents_bytes)
+    cached = cache.get(digest)
+    if timings is not None:
+        timings.lap('cache')
+    if cached is not None:
+        return FileResult(*cached)
+    else:
+        result = _fix_contents(contents_bytes, settings, timings)
+        cache.put(digest, result)
+        return result
+
+
+def _open_cache(cache_key: tuple[str, str] | None) -> Cache | None:
+    if cache_key is None:
+        return None
+
+    import sqlite3
 
     try:
-        contents_text_orig = contents_text = contents_bytes.decode()
-    except UnicodeDecodeError:
-        print(f'{filename} is non-utf-8 (not supported)')
-        return EXIT_CHANGES
-
-    # Check for removed modules first
-    removed_errors = _check_removed_modules(contents_text)
-    if removed_errors:
-        for lineno, mod_name, suggestion in removed_errors:
-            print(
-                f'{RED}{filename}:{lineno}: '
-                f'ERROR: module "{mod_name}" has been removed. {suggestion}{RESET}',
-                file=sys.stderr,
-            )
-        return EXIT_FATAL
-
-    # Check for potential deprecated methods and warn
-    if filename != '-':  # Don't warn for stdin
-        potential_warnings = _check_potential_deprecated_methods(contents_text)
-        for lineno, method_name, deprecated_type, replacement, safe_type in potential_warnings:
-            msg = (
-                f'{YELLOW}{filename}:{lineno}: '
-                f'WARNING: .{method_name}() - check if this is {deprecated_type}, '
-                f'if so use {replacement} instead'
-            )
-            if safe_type:
-                msg += f' ({safe_type}.{method_name}() is valid, no change needed)'
-            msg += f'{RESET}'
-            print(msg, file=sys.stderr)
-
-    contents_text = _fix_plugins(
-        contents_text,
-        settings=Settings(
-            min_version=args.min_version,
-            check_only=args.check,
-        ),
-    )
+        return Cache.open(*cache_key)
+    except (OSError, sqlite3.Error) as e:
+        print(f'warning: not using cache: {e}', file=sys.stderr)
+        return None
 
-    if args.check:
-        if contents_text != contents_text_orig:
+
+def _fix_files(
+        filenames: list[str],
+        settings: Settings,
+        cache_key: tuple[str, str] | None,
+        timed: bool = False,
+) -> tuple[list[FileResult], Timings | None]:
+    """Fix a batch of files in a worker, with timings if `timed`."""
+    timings = Timings() if timed else None
+    cache = _open_cache(cache_key)
+    try:
+        results = [
+            _fix_file(filename, settings, cache, timings)
+            for filename in filenames
+        ]
+    finally:
+        if cache is not None:
+            cache.close()
+    return results, timings
+
+
+def _report(
+        filename: str,
+        result: FileResult,
+        args: argparse.Namespace,
+) -> int:
+    if args.reporter is not None:
+        for msg in result.messages:
+            args.reporter.add(filename, msg)
+    else:
+        for msg in result.messages:
+            if msg.rule == 'non-utf-8':
+                print(f'{filename} is non-utf-8 (not supported)')
+            elif msg.severity == 'fix':
+                pass
+            # Don't warn for stdin
+            elif filename != '-' or msg.severity == 'error':
+                print(_format_message(filename, msg), file=sys.stderr)
+
+    if result.new_contents is None:
+        pass
+    elif args.check:
+        if args.reporter is None:
             print(f'{filename}: would be rewritten')
-            return EXIT_CHANGES
-        return EXIT_OK
+    elif filename != '-':
+        if args.reporter is None:
+            print(f'Rewriting {filename}', file=sys.stderr)
+        if args.timings is not None:
+            args.timings.start()
+        with open(filename, 'wb') as f:
+            f.write(result.new_contents)
+        if args.timings is not None:
+            args.timings.lap('write')
+
+    return result.ret
 
+
+def _fix_stdin(args: argparse.Namespace) -> FileResult:
+    t0 = time.perf_counter()
+    if args.timings is not None:
+        args.timings.start()
+    contents_bytes = sys.stdin.buffer.read()
+    if args.timings is not None:
+        args.timings.lap('read')
+    result = _fix_contents(contents_bytes, args.settings, args.timings)
+    if args.timings is not None:
+        args.timings.add_file('-', time.perf_counter() - t0)
+    processed = result.ret == EXIT_OK or result.new_contents is not None
+    if processed and not args.check:
+        print((result.new_contents or contents_bytes).decode(), end='')
+    return result
+
+
+def _fix_one(
+        filename: str,
+        args: argparse.Namespace,
+        cache: Cache | None,
+) -> FileResult:
     if filename == '-':
-        print(contents_text, end='')
-    elif contents_text != contents_text_orig:
-        print(f'Rewriting {filename}', file=sys.stderr)
-        with open(filename, 'w', encoding='UTF-8', newline='') as f:
-            f.write(contents_text)
+        return _fix_stdin(args)
+    else:
+        return _fix_file(filename, args.settings, cache, args.timings)
+
 
-    return EXIT_CHANGES if contents_text != contents_text_orig else EXIT_OK
+def _fail_fast(
+        results: Iterable[tuple[str, FileResult]],
+        stop_at: frozenset[int],
+) -> Iterator[tuple[str, FileResult]]:
+    """`results` up to the first one with an exit status in `stop_at`
+
+    only that one is reported: the others are held back until `results` is
+    exhausted without stopping.
+    """
+    held = []
+    for filename, result in results:
+        if result.ret in stop_at:
+            yield filename, result
+            return
+        elif result.new_contents is not None:
+            # (only whether it would be rewritten is reported)
+            result = result._replace(new_contents=b'')
+        held.append((filename, result))
+    yield from held
+
+
+def _batched(filenames: Iterable[str], n: int) -> Iterator[list[str]]:
+    it = iter(filenames)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
+def _results(
+        filenames: Iterable[str],
+        args: argparse.Namespace,
+) -> Generator[tuple[str, FileResult], None, None]:
+    """Fix files in a process (or thread) pool, yielding results in order.
+
+    Batches are submitted as `filenames` produces them with a bounded number
+    in flight, so work starts immediately and memory stays flat.  The
+    timings of the workers are merged into `args.timings`.  When the
+    generator is closed early (`--fail-fast`) no more files are taken from
+    `filenames` and the batches not started yet are cancelled.
+    """
+    import concurrent.futures
+
+    executor_cls: type[concurrent.futures.Executor]
+    if args.executor == 'threads':
+        # the threads share the plugin registry, it must not change anymore
+        load_plugins()
+        executor_cls = concurrent.futures.ThreadPoolExecutor
+    else:
+        executor_cls = concurrent.futures.ProcessPoolExecutor
+
+    def _batch_results(
+            batch: list[str],
+            future: concurrent.futures.Future[
+                tuple[list[FileResult], Timings | None]
+            ],
+    ) -> Iterator[tuple[str, FileResult]]:
+        results, timings = future.result()
+        if timings is not None:
+            args.timings.merge(timings)
+        return zip(batch, results)
+
+    pending: collections.deque[
+        tuple[
+            list[str],
+            concurrent.futures.Future[tuple[list[FileResult], Timings | None]],
+        ]
+    ]
+    pending = collections.deque()
+    with executor_cls(args.jobs) as executor:
+        try:
+            for batch in _batched(filenames, BATCH_SIZE):
+                future = executor.submit(
+                    _fix_files,
+                    batch,
+                    args.settings,
+                    args.cache_key,
+                    args.timings is not None,
+                )
+                pending.append((batch, future))
+                if len(pending) >= args.jobs * 4:
+                    yield from _batch_results(*pending.popleft())
+            while pending:
+                yield from _batch_results(*pending.popleft())
+        except GeneratorExit:
+            # only the batches already running are waited for
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def _default_executor() -> str:
+    """threads only run in parallel on free-threaded builds"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    if is_gil_enabled is not None and not is_gil_enabled():
+        return 'threads'
+    else:
+        return 'processes'
+
+
+def _parallel(args: argparse.Namespace) -> bool:
+    """whether the files are fixed in a pool of processes (or threads)"""
+    return (
+        args.jobs > 1 and
+        '-' not in args.filenames and
+        (
+            len(args.filenames) > 1 or
+            any(os.path.isdir(path) for path in args.filenames)
+        )
+    )
 
 
 def main(argv: Sequence[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if (
+            '--daemon' not in argv and
+            '--no-daemon' not in argv and
+            # it pays for startup only once anyway, and streams its results
+            '--batch' not in argv and
+            not os.environ.get('PYBREAKINGFIX_NO_DAEMON')
+    ):
+        ret = _daemon.forward(argv)
+        if ret is not None:
+            return ret
+
+    return _main(argv)
+
+
+def _main(argv: Sequence[str], *, in_daemon: bool = False) -> int:
+    import argparse
+
     parser = argparse.ArgumentParser(
+        # (not `__main__.py`, when run with -m or in the daemon)
+        prog='pybreakingfix',
         description='Detect and fix Python breaking changes (3.7 -> 3.12)',
     )
     parser.add_argument('filenames', nargs='*')
@@ -254,19 +851,237 @@ def main(argv: Sequence[str] | None = None) -> int:
         action='store_true',
         help='Check only, do not modify files',
     )
+    parser.add_argument(
+        '--fail-fast',
+        action='store_const',
+        const='fatal',
+        help=(
+            'With --check, stop at the first file with a fatal error: no more '
+            'files are searched for or processed, and only that file is '
+            'reported (the others are reported if the run does not stop)'
+        ),
+    )
+    parser.add_argument(
+        '--fail-fast-on-changes',
+        dest='fail_fast',
+        action='store_const',
+        const='changes',
+        help=(
+            'Like --fail-fast, also stopping at the first file which would '
+            'be rewritten'
+        ),
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=os.cpu_count() or 1,
+        help=(
+            'Number of processes (or threads) to use '
+            '(default: number of CPUs)'
+        ),
+    )
+    parser.add_argument(
+        '--executor',
+        choices=('processes', 'threads'),
+        default=_default_executor(),
+        help=(
+            'Run the jobs in processes or threads (default: threads when the '
+            'GIL is disabled, otherwise processes)'
+        ),
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        metavar='PATTERN',
+        help=(
+            'Glob pattern of files / directories to skip when searching '
+            'directories, may be given multiple times '
+            f'(always excluded: {", ".join(DEFAULT_EXCLUDES)})'
+        ),
+    )
+    parser.add_argument(
+        '--changed-since',
+        metavar='REF',
+        help=(
+            'Only process python files added or modified (staged, unstaged '
+            'or untracked) relative to this git ref, limited to the given '
+            'paths if any'
+        ),
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='Do not use (or update) the cache of previous results',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=default_cache_dir(),
+        help='Directory to store cached results in (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help=(
+            'Run a resident server which later invocations forward their '
+            'work to, avoiding startup costs'
+        ),
+    )
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help='Do not forward to a running daemon',
+    )
+    parser.add_argument(
+        '--format',
+        choices=('text', 'json', 'jsonl', 'sarif'),
+        default='text',
+        help=(
+            'Write the errors, warnings and fixes of each file to stdout as '
+            'a json array, json lines or a SARIF log instead of text '
+            '(default: %(default)s)'
+        ),
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help=(
+            'Print the time spent in each phase and plugin, and the slowest '
+            'files, to stderr at the end'
+        ),
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help=(
+            'Read sources to fix as json lines from stdin and write a json '
+            'line with the result for each one to stdout, without touching '
+            'any files'
+        ),
+    )
     args = parser.parse_args(argv)
 
+    if args.batch and (args.filenames or args.changed_since is not None):
+        parser.error('--batch reads the sources to fix from stdin')
+    if args.format != 'text' and (args.batch or '-' in args.filenames):
+        parser.error(f'--format={args.format} cannot be used with stdin')
+    if args.fail_fast is not None and not args.check:
+        parser.error(
+            '--fail-fast and --fail-fast-on-changes can only be used with '
+            '--check',
+        )
+
+    if args.daemon:
+        return _daemon.serve(
+            _daemon.socket_path(), functools.partial(_main, in_daemon=True),
+        )
+
     # Fixed target version: 3.12
     args.min_version = (3, 12)
+    args.settings = Settings(
+        min_version=args.min_version,
+        check_only=args.check,
+        # the text output of --check does not show the fixes themselves
+        report_fixes=args.batch or args.format != 'text',
+    )
+
+    exclude = compile_excludes((*DEFAULT_EXCLUDES, *args.exclude))
+    if args.changed_since is not None:
+        import subprocess
+
+        try:
+            changed = git_changed_files(args.changed_since)
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, 'stderr', None)
+            parser.error(
+                f'--changed-since: could not ask git for changed files: '
+                f'{os.fsdecode(stderr).strip() if stderr else e}',
+            )
+        args.filenames = list(filter_paths(changed, args.filenames, exclude))
+    filenames = expand_paths(args.filenames, exclude)
+    if in_daemon and _parallel(args):
+        # a pool per request costs the daemon more than it saves the client
+        raise _daemon.Declined
+
+    if args.cache and (args.filenames or args.batch):
+        args.cache_key = (args.cache_dir, ruleset_key(args.settings))
+    else:
+        args.cache_key = None
+
+    args.timings = Timings() if args.timings else None
+    if args.format == 'text':
+        args.reporter = None
+    else:
+        from pybreakingfix._reporters import REPORTERS
+
+        args.reporter = REPORTERS[args.format](
+            sys.stdout, check_only=args.check,
+        )
+
+    cache = _open_cache(args.cache_key)
+    results: Generator[tuple[str, FileResult], None, None] | None = None
+    try:
+        rets: Iterable[int]
+        if args.batch:
+            from pybreakingfix import _batch
+
+            def _fix_record(
+                    filename: str,
+                    contents_bytes: bytes,
+            ) -> FileResult:
+                if args.timings is None:
+                    return _fix_contents_cached(
+                        contents_bytes, args.settings, cache,
+                    )
+
+                t0 = time.perf_counter()
+                args.timings.start()
+                result = _fix_contents_cached(
+                    contents_bytes, args.settings, cache, timings=args.timings,
+                )
+                args.timings.add_file(filename, time.perf_counter() - t0)
+                return result
+
+            rets = _batch.run(
+                sys.stdin.buffer, sys.stdout, _fix_record, check=args.check,
+            )
+        else:
+            fixed: Iterable[tuple[str, FileResult]]
+            if _parallel(args):
+                fixed = results = _results(filenames, args)
+            else:
+                fixed = (
+                    (filename, _fix_one(filename, args, cache))
+                    for filename in filenames
+                )
+            if args.fail_fast is not None:
+                fixed = _fail_fast(fixed, FAIL_FAST[args.fail_fast])
+            rets = (
+                _report(filename, result, args) for filename, result in fixed
+            )
+
+        fail_fast = FAIL_FAST.get(args.fail_fast, frozenset())
+        ret = EXIT_OK
+        for result in rets:
+            # Fatal errors take precedence
+            if result == EXIT_FATAL:
+                ret = EXIT_FATAL
+            elif result == EXIT_CHANGES and ret != EXIT_FATAL:
+                ret = EXIT_CHANGES
+            if result in fail_fast:
+                break
+        if args.reporter is not None:
+            args.reporter.close()
+    finally:
+        if results is not None:
+            results.close()
+        if cache is not None:
+            cache.evict()
+            cache.close()
 
-    ret = EXIT_OK
-    for filename in args.filenames:
-        result = _fix_file(filename, args)
-        # Fatal errors take precedence
-        if result == EXIT_FATAL:
-            ret = EXIT_FATAL
-        elif result == EXIT_CHANGES and ret != EXIT_FATAL:
-            ret = EXIT_CHANGES
+    if args.timings is not None:
+        args.timings.report(sys.stderr)
     return ret
 
 
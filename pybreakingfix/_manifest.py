@@ -0,0 +1,67 @@
+# GENERATED VIA generate-manifest
+from __future__ import annotations
+
+# AST node type name -> plugin modules with callbacks for it
+NODE_TYPE_MODULES = {
+    'Attribute': (
+        'pybreakingfix._plugins.renames',
+    ),
+    'Call': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+    'Import': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'ImportFrom': (
+        'pybreakingfix._plugins.removed_modules',
+        'pybreakingfix._plugins.renames',
+    ),
+}
+# trigger identifier -> plugin modules with plugins it triggers
+TRIGGER_MODULES = {
+    'asynchat': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'asyncio': (
+        'pybreakingfix._plugins.renames',
+    ),
+    'asyncore': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'base64': (
+        'pybreakingfix._plugins.renames',
+    ),
+    'collections': (
+        'pybreakingfix._plugins.renames',
+    ),
+    'distutils': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'fractions': (
+        'pybreakingfix._plugins.renames',
+    ),
+    'fromstring': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+    'getchildren': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+    'getiterator': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+    'imp': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'isAlive': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+    'smtpd': (
+        'pybreakingfix._plugins.removed_modules',
+    ),
+    'tostring': (
+        'pybreakingfix._plugins.deprecated_methods',
+    ),
+}
+# plugin modules with plugins which do not declare triggers
+UNTRIGGERED_MODULES = ()
+# END GENERATED
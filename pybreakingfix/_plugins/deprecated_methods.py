@@ -1,26 +1,16 @@
 from __future__ import annotations
 
 import ast
-import functools
 from collections.abc import Iterable
 
 from tokenize_rt import Offset
-from tokenize_rt import Token
 
-from pybreakingfix._ast_helpers import ast_to_offset
+from pybreakingfix._data import Message
 from pybreakingfix._data import register
 from pybreakingfix._data import State
 from pybreakingfix._data import TokenFunc
 
 
-# Module-level function renames: (module, old_func) -> new_func
-# These are safe to replace because we can verify the module name
-MODULE_FUNCTION_RENAMES = {
-    # base64 module (removed in 3.9)
-    ('base64', 'encodestring'): 'encodebytes',
-    ('base64', 'decodestring'): 'decodebytes',
-}
-
 # NOTE: We intentionally do NOT auto-replace these because we cannot
 # statically determine the object type:
 #
@@ -29,49 +19,54 @@ MODULE_FUNCTION_RENAMES = {
 # - element.getchildren() / element.getiterator() - could be xml Element or other
 # - etree.tostring() is a VALID function in xml.etree.ElementTree!
 #
-# These require manual review or type-aware tools.
-
+# These require manual review or type-aware tools, so we only warn about
+# them.
+# Format: method_name -> (deprecated_type, replacement, safe_type)
+# - deprecated_type: the type where this method is deprecated
+# - replacement: what to use instead
+# - safe_type: type where this method is still valid (optional)
+POTENTIAL_DEPRECATED_METHODS = {
+    'tostring': ('array.array', '.tobytes()', 'etree'),
+    'fromstring': ('array.array', '.frombytes()', 'etree'),
+    'isAlive': ('threading.Thread', '.is_alive()', ''),
+    'getchildren': ('xml.etree.Element', 'list(element)', ''),
+    'getiterator': ('xml.etree.Element', 'element.iter()', ''),
+}
 
-def _fix_module_function_rename(
-        i: int,
-        tokens: list[Token],
-        *,
-        old_name: str,
-        new_name: str,
-) -> None:
-    """Replace old function name with new function name."""
-    while i < len(tokens):
-        if tokens[i].src == old_name:
-            tokens[i] = tokens[i]._replace(src=new_name)
-            return
-        i += 1
+# etree.tostring, etree.fromstring are valid
+ETREE_NAMES = frozenset(('etree', 'ET', 'ElementTree'))
+ETREE_FUNCTIONS = frozenset(('tostring', 'fromstring'))
 
 
-@register(ast.Call)
+@register(
+    ast.Call,
+    triggers=POTENTIAL_DEPRECATED_METHODS,
+)
 def visit_Call(
         state: State,
         node: ast.Call,
         parent: ast.AST,
 ) -> Iterable[tuple[Offset, TokenFunc]]:
-    # Skip if not targeting 3.9+
-    if state.settings.min_version < (3, 9):
-        return
-
-    # Handle module-level function calls: module.func()
-    # Only match when we can verify the module name
     if (
             isinstance(node.func, ast.Attribute) and
-            isinstance(node.func.value, ast.Name)
+            node.func.attr in POTENTIAL_DEPRECATED_METHODS and
+            not (
+                isinstance(node.func.value, ast.Name) and
+                node.func.value.id in ETREE_NAMES and
+                node.func.attr in ETREE_FUNCTIONS
+            )
     ):
-        module_name = node.func.value.id
-        func_name = node.func.attr
-        key = (module_name, func_name)
+        state.messages.append(
+            Message(
+                line=node.lineno,
+                col=node.col_offset,
+                rule='potential-deprecated-method',
+                severity='warning',
+                args=(
+                    node.func.attr,
+                    *POTENTIAL_DEPRECATED_METHODS[node.func.attr],
+                ),
+            ),
+        )
 
-        if key in MODULE_FUNCTION_RENAMES:
-            new_name = MODULE_FUNCTION_RENAMES[key]
-            func = functools.partial(
-                _fix_module_function_rename,
-                old_name=func_name,
-                new_name=new_name,
-            )
-            yield ast_to_offset(node), func
+    return ()
@@ -1,9 +1,9 @@
 """
 Plugin to detect imports of removed modules.
 
-Note: This plugin is a placeholder for documentation purposes.
-The actual error reporting for removed modules is handled in _main.py
-since these require manual migration rather than automatic fixing.
+These require manual migration rather than automatic fixing, so this plugin
+never produces token callbacks -- it only records an error message which
+_main.py reports (exit code 2).
 
 Removed modules in Python 3.12:
 - distutils -> use setuptools
@@ -14,13 +14,23 @@ Removed modules in Python 3.12:
 """
 from __future__ import annotations
 
+import ast
+from collections.abc import Iterable
+
+from tokenize_rt import Offset
+
+from pybreakingfix._data import Message
+from pybreakingfix._data import register
+from pybreakingfix._data import State
+from pybreakingfix._data import TokenFunc
+
 # Removed modules and their alternatives
 REMOVED_MODULES = {
-    'distutils': 'setuptools',
-    'asynchat': 'asyncio',
-    'asyncore': 'asyncio',
-    'smtpd': 'aiosmtpd (external package)',
-    'imp': 'importlib',
+    'distutils': 'Use setuptools instead',
+    'asynchat': 'Use asyncio instead',
+    'asyncore': 'Use asyncio instead',
+    'smtpd': 'Use aiosmtpd package instead',
+    'imp': 'Use importlib instead',
 }
 
 # Version when each module was removed
@@ -31,3 +41,42 @@ REMOVAL_VERSIONS = {
     'smtpd': (3, 12),
     'imp': (3, 12),
 }
+
+
+def _check_module(state: State, node: ast.stmt, name: str) -> None:
+    mod_name = name.split('.')[0]
+    if (
+            mod_name in REMOVED_MODULES and
+            state.settings.min_version >= REMOVAL_VERSIONS[mod_name]
+    ):
+        state.messages.append(
+            Message(
+                line=node.lineno,
+                col=node.col_offset,
+                rule='removed-module',
+                severity='error',
+                args=(mod_name, REMOVED_MODULES[mod_name]),
+            ),
+        )
+
+
+@register(ast.Import, triggers=REMOVED_MODULES)
+def visit_Import(
+        state: State,
+        node: ast.Import,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    for alias in node.names:
+        _check_module(state, node, alias.name)
+    return ()
+
+
+@register(ast.ImportFrom, triggers=REMOVED_MODULES)
+def visit_ImportFrom(
+        state: State,
+        node: ast.ImportFrom,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    if node.module:
+        _check_module(state, node, node.module)
+    return ()
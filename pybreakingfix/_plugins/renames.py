@@ -0,0 +1,345 @@
+"""names which were removed and what replaces them, declared in `RULES`
+
+the rules are compiled into `DISPATCH`, keyed by the dotted name they
+replace: a single lookup per attribute / imported name tells whether any
+rule applies, however many rules there are.  a rule rewrites:
+
+- the dotted name itself: `base64.encodestring` -> `base64.encodebytes`
+  (only when called for `call` rules)
+- imports of the name from its module, when the replacement is the same
+  name in another module: `from fractions import gcd` -> `from math import gcd`
+
+a name is never replaced with itself, so every fix changes the source: the
+plugins are registered as `definite` (check mode need not tokenize).
+"""
+from __future__ import annotations
+
+import ast
+import collections
+import functools
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from tokenize_rt import NON_CODING_TOKENS
+from tokenize_rt import Offset
+from tokenize_rt import Token
+
+from pybreakingfix._ast_helpers import ast_to_offset
+from pybreakingfix._data import Fix
+from pybreakingfix._data import register
+from pybreakingfix._data import State
+from pybreakingfix._data import TokenFunc
+from pybreakingfix._data import Version
+from pybreakingfix._token_helpers import indented_amount
+from pybreakingfix._token_helpers import Tokens
+
+
+class Rule(NamedTuple):
+    # the rule id of the fixes it makes
+    rule: str
+    # the dotted name which is replaced, `module.name` / `module.Class.name`
+    name: str
+    replacement: str
+    # only fixed when targeting this version (or later)
+    min_version: Version
+    # only calls of the name are rewritten: `name(...)`
+    call: bool = False
+    # the replacement is written as a bare name, imported from its module
+    from_import: bool = False
+
+    @property
+    def moved_to(self) -> str | None:
+        """the module the name moved to, if only its module changed"""
+        module, _, attr = self.name.rpartition('.')
+        new_module, _, new_attr = self.replacement.rpartition('.')
+        if attr == new_attr and module != new_module:
+            return new_module
+        else:
+            return None
+
+
+# Breaking change: collections ABCs moved to collections.abc in 3.10
+# from collections import Mapping -> ImportError in 3.10+
+# collections.Mapping -> AttributeError in 3.10+
+COLLECTIONS_ABC_NAMES = (
+    'AsyncGenerator',
+    'AsyncIterable',
+    'AsyncIterator',
+    'Awaitable',
+    'ByteString',
+    'Callable',
+    'Collection',
+    'Container',
+    'Coroutine',
+    'Generator',
+    'Hashable',
+    'ItemsView',
+    'Iterable',
+    'Iterator',
+    'KeysView',
+    'Mapping',
+    'MappingView',
+    'MutableMapping',
+    'MutableSequence',
+    'MutableSet',
+    'Reversible',
+    'Sequence',
+    'Set',
+    'Sized',
+    'ValuesView',
+)
+
+RULES = (
+    # base64 module (removed in 3.9)
+    Rule(
+        'base64-bytes', 'base64.encodestring', 'base64.encodebytes', (3, 9),
+        call=True,
+    ),
+    Rule(
+        'base64-bytes', 'base64.decodestring', 'base64.decodebytes', (3, 9),
+        call=True,
+    ),
+    # asyncio.Task class methods that became module-level functions in 3.9
+    Rule(
+        'asyncio-task-methods',
+        'asyncio.Task.current_task', 'asyncio.current_task', (3, 9),
+        call=True,
+    ),
+    Rule(
+        'asyncio-task-methods',
+        'asyncio.Task.all_tasks', 'asyncio.all_tasks', (3, 9),
+        call=True,
+    ),
+    # fractions.gcd (removed in 3.9)
+    Rule('fractions-gcd', 'fractions.gcd', 'math.gcd', (3, 9), call=True),
+    # collections.abc exists since 3.3, so these are always safe
+    *(
+        Rule(
+            'collections-abc',
+            f'collections.{name}', f'collections.abc.{name}', (3, 3),
+            from_import=True,
+        )
+        for name in COLLECTIONS_ABC_NAMES
+    ),
+)
+
+
+def compile_rules(rules: Iterable[Rule]) -> dict[str, Rule]:
+    """the rules by the dotted name they replace"""
+    ret: dict[str, Rule] = {}
+    for rule in rules:
+        if rule.name in ret:
+            raise ValueError(f'more than one rule for {rule.name}')
+        elif rule.replacement == rule.name:
+            raise ValueError(f'{rule.name} is replaced with itself')
+        ret[rule.name] = rule
+    return ret
+
+
+DISPATCH = compile_rules(RULES)
+# longer attribute chains never match a rule: they are not even looked up
+MAX_PARTS = max(rule.name.count('.') + 1 for rule in RULES)
+# every dotted name (and every import of one) starts with its module
+TRIGGERS = frozenset(rule.name.partition('.')[0] for rule in RULES)
+
+
+def _dotted_name(node: ast.Attribute) -> str | None:
+    """`a.b.c` for an attribute chain of `MAX_PARTS` names at most
+
+    not for a parenthesized one (`(a.b).c`, which starts before its first
+    name): its tokens are not a dotted name to replace.
+    """
+    parts = [node.attr]
+    value = node.value
+    while isinstance(value, ast.Attribute) and len(parts) < MAX_PARTS:
+        parts.append(value.attr)
+        value = value.value
+    if (
+            isinstance(value, ast.Name) and
+            len(parts) < MAX_PARTS and
+            value.lineno == node.lineno and
+            value.col_offset == node.col_offset
+    ):
+        parts.append(value.id)
+        return '.'.join(reversed(parts))
+    else:
+        return None
+
+
+def _next_code(tokens: Tokens, i: int) -> int:
+    """the index of the first token from `i` which is not whitespace or a
+    comment
+    """
+    while tokens[i].name in NON_CODING_TOKENS:
+        i += 1
+    return i
+
+
+def _replace_dotted(
+        i: int,
+        tokens: Tokens,
+        name: str,
+        replacement: str,
+) -> bool:
+    """replace the dotted `name` starting at token `i` with `replacement`
+
+    only whitespace and comments may separate its parts: anything else
+    (`(collections).Mapping`) is not this name and is left alone.  returns
+    whether it was replaced.
+    """
+    parts = name.split('.')
+    j = i
+    for n, part in enumerate(parts):
+        if n:
+            j = _next_code(tokens, j + 1)
+            if not tokens[j].matches(name='OP', src='.'):
+                return False
+            j = _next_code(tokens, j + 1)
+        if not tokens[j].matches(name='NAME', src=part):
+            return False
+    tokens.replace(i, j + 1, (Token('CODE', replacement),))
+    return True
+
+
+def _fix_renamed_attribute(
+        i: int,
+        tokens: Tokens,
+        *,
+        rule: Rule,
+        needs_import: bool,
+) -> None:
+    if rule.from_import:
+        module, _, name = rule.replacement.rpartition('.')
+        if _replace_dotted(i, tokens, rule.name, name) and needs_import:
+            tokens.add_import(module, name)
+    else:
+        _replace_dotted(i, tokens, rule.name, rule.replacement)
+
+
+def _fix_moved_import_module(
+        i: int,
+        tokens: Tokens,
+        *,
+        module: str,
+        new_module: str,
+) -> None:
+    """every name imported moved: `from {module}` -> `from {new_module}`"""
+    _replace_dotted(_next_code(tokens, i + 1), tokens, module, new_module)
+
+
+def _fix_moved_import_split(
+        i: int,
+        tokens: Tokens,
+        *,
+        names: dict[str, list[str]],
+) -> None:
+    """split the import into one statement per module
+
+    from collections import namedtuple, Mapping
+    ->
+    from collections import namedtuple
+    from collections.abc import Mapping
+    """
+    try:
+        sep = f'\n{indented_amount(i, tokens)}'
+    except ValueError:  # after another statement: `x = 1; from ...`
+        sep = '; '
+    new_code = sep.join(
+        f'from {module} import {", ".join(module_names)}'
+        for module, module_names in names.items()
+    )
+    # up to the end of this statement: not over a statement after a `;`
+    end = tokens.token_index.line_end(i)
+    semicolon = tokens.token_index.find(i, 'OP', ';')
+    if semicolon is not None and semicolon < end:
+        end = semicolon
+    # (nor over the comment or whitespace before it)
+    while tokens[end - 1].name in NON_CODING_TOKENS:
+        end -= 1
+    tokens.replace(i, end, (Token('CODE', new_code),))
+
+
+@register(ast.Attribute, triggers=TRIGGERS, definite=True)
+def visit_Attribute(
+        state: State,
+        node: ast.Attribute,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    name = _dotted_name(node)
+    if name is None:
+        return
+    rule = DISPATCH.get(name)
+    if (
+            rule is None or
+            state.settings.min_version < rule.min_version or
+            (
+                rule.call and
+                not (isinstance(parent, ast.Call) and parent.func is node)
+            )
+    ):
+        return
+
+    if rule.from_import:
+        # imports of it from the old module are moved as well
+        old_module, _, _ = rule.name.rpartition('.')
+        module, _, attr = rule.replacement.rpartition('.')
+        needs_import = (
+            attr not in state.from_imports.get(module, set()) and
+            attr not in state.from_imports.get(old_module, set())
+        )
+    else:
+        needs_import = False
+    func = functools.partial(
+        _fix_renamed_attribute,
+        rule=rule,
+        needs_import=needs_import,
+    )
+    yield ast_to_offset(node), Fix(rule.rule, func)
+
+
+@register(ast.ImportFrom, triggers=TRIGGERS, definite=True)
+def visit_ImportFrom(
+        state: State,
+        node: ast.ImportFrom,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    if node.level != 0 or node.module is None:
+        return
+
+    # the names to import from each module, the original one first
+    names: dict[str, list[str]] = collections.defaultdict(list)
+    names[node.module] = []
+    first_rule = None
+    for alias in node.names:
+        rule = DISPATCH.get(f'{node.module}.{alias.name}')
+        if (
+                rule is not None and
+                rule.moved_to is not None and
+                state.settings.min_version >= rule.min_version
+        ):
+            module = rule.moved_to
+            first_rule = first_rule or rule
+        else:
+            module = node.module
+
+        if alias.asname:
+            names[module].append(f'{alias.name} as {alias.asname}')
+        else:
+            names[module].append(alias.name)
+
+    if first_rule is None:
+        return
+
+    if not names[node.module] and len(names) == 2:
+        (new_module,) = names.keys() - {node.module}
+        func = functools.partial(
+            _fix_moved_import_module,
+            module=node.module,
+            new_module=new_module,
+        )
+    else:
+        func = functools.partial(
+            _fix_moved_import_split,
+            names={module: lst for module, lst in names.items() if lst},
+        )
+    yield ast_to_offset(node), Fix(first_rule.rule, func)
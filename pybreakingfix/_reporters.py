@@ -0,0 +1,186 @@
+"""machine readable output of the messages of a run (--format)
+
+the output is buffered and written in large chunks: a run may produce tens
+of thousands of messages.
+"""
+from __future__ import annotations
+
+import abc
+import json
+from typing import IO
+
+from pybreakingfix._data import Message
+
+# write out the buffered output once it grows past this many characters
+BUFFER_SIZE = 64 * 1024
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+_SARIF_LEVELS = {'error': 'error', 'warning': 'warning', 'fix': 'note'}
+
+
+def message_text(msg: Message, *, check_only: bool = False) -> str:
+    """the text of a message, without the filename / line / severity
+
+    fixes are only applied when not `check_only`
+    """
+    if msg.rule == 'removed-module':
+        mod_name, suggestion = msg.args
+        return f'module "{mod_name}" has been removed. {suggestion}'
+    elif msg.rule == 'potential-deprecated-method':
+        method_name, deprecated_type, replacement, safe_type = msg.args
+        ret = (
+            f'.{method_name}() - check if this is {deprecated_type}, '
+            f'if so use {replacement} instead'
+        )
+        if safe_type:
+            ret += (
+                f' ({safe_type}.{method_name}() is valid, no change needed)'
+            )
+        return ret
+    elif msg.rule == 'non-utf-8':
+        return 'file is non-utf-8 (not supported)'
+    elif msg.rule == 'overlapping-edits':
+        (error,) = msg.args
+        return f'fixes overlap, file left unchanged: {error}'
+    elif check_only:
+        return f'would fix: {msg.rule}'
+    else:
+        return f'fixed: {msg.rule}'
+
+
+class Reporter(abc.ABC):
+    """writes the messages of each file to `file`, see `REPORTERS`"""
+
+    def __init__(self, file: IO[str], *, check_only: bool) -> None:
+        self._file = file
+        self._check_only = check_only
+        self._parts: list[str] = []
+        self._size = 0
+
+    def _write(self, s: str) -> None:
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write(''.join(self._parts))
+        self._file.flush()
+        self._parts.clear()
+        self._size = 0
+
+    def _finding(self, filename: str, msg: Message) -> dict[str, object]:
+        return {
+            'file': filename,
+            'line': msg.line,
+            'col': msg.col,
+            'rule': msg.rule,
+            'severity': msg.severity,
+            'message': message_text(msg, check_only=self._check_only),
+            'args': list(msg.args),
+        }
+
+    @abc.abstractmethod
+    def add(self, filename: str, msg: Message) -> None: ...
+
+    def close(self) -> None:
+        self.flush()
+
+
+class JSONLinesReporter(Reporter):
+    """a json object per line for each message"""
+
+    def add(self, filename: str, msg: Message) -> None:
+        self._write(f'{json.dumps(self._finding(filename, msg))}\n')
+
+
+class JSONReporter(Reporter):
+    """a json array of the messages, written out as they come"""
+
+    def __init__(self, file: IO[str], *, check_only: bool) -> None:
+        super().__init__(file, check_only=check_only)
+        self._sep = '['
+
+    def add(self, filename: str, msg: Message) -> None:
+        finding = json.dumps(self._finding(filename, msg))
+        self._write(f'{self._sep}\n  {finding}')
+        self._sep = ','
+
+    def close(self) -> None:
+        self._write('[]\n' if self._sep == '[' else '\n]\n')
+        super().close()
+
+
+class SARIFReporter(Reporter):
+    """a SARIF 2.1.0 log with a single run
+
+    columns are counted from 1 in utf-16 code units (as SARIF has them by
+    default), where messages have utf-8 byte offsets from 0: the lines are
+    read back from the file (before it is rewritten) to convert them.
+    """
+
+    def __init__(self, file: IO[str], *, check_only: bool) -> None:
+        super().__init__(file, check_only=check_only)
+        self._sep = ''
+        self._rules: dict[str, None] = {}
+        # the lines of the last file a column was needed for
+        self._lines: tuple[str, list[bytes] | None] = ('', None)
+        self._write(
+            f'{{"version": "2.1.0", "$schema": "{SARIF_SCHEMA}", '
+            f'"runs": [{{"results": [',
+        )
+
+    def _column(self, filename: str, line: int, col: int) -> int | None:
+        if col == 0:
+            return 1
+
+        if self._lines[0] != filename:
+            try:
+                with open(filename, 'rb') as f:
+                    self._lines = (filename, f.read().splitlines())
+            except OSError:
+                self._lines = (filename, None)
+        lines = self._lines[1]
+        if lines is None or line > len(lines):
+            return None
+
+        text = lines[line - 1][:col].decode('UTF-8', 'replace')
+        return len(text.encode('UTF-16-LE')) // 2 + 1
+
+    def add(self, filename: str, msg: Message) -> None:
+        self._rules[msg.rule] = None
+        location: dict[str, object] = {'artifactLocation': {'uri': filename}}
+        if msg.line:
+            region = {'startLine': msg.line}
+            column = self._column(filename, msg.line, msg.col)
+            if column is not None:
+                region['startColumn'] = column
+            location['region'] = region
+        result = {
+            'ruleId': msg.rule,
+            'level': _SARIF_LEVELS[msg.severity],
+            'message': {
+                'text': message_text(msg, check_only=self._check_only),
+            },
+            'locations': [{'physicalLocation': location}],
+        }
+        self._write(f'{self._sep}\n  {json.dumps(result)}')
+        self._sep = ','
+
+    def close(self) -> None:
+        driver = {
+            'name': 'pybreakingfix',
+            'rules': [{'id': rule} for rule in sorted(self._rules)],
+        }
+        self._write(
+            f'\n], "columnKind": "utf16CodeUnits", '
+            f'"tool": {{"driver": {json.dumps(driver)}}}}}]}}\n',
+        )
+        super().close()
+
+
+REPORTERS: dict[str, type[Reporter]] = {
+    'json': JSONReporter,
+    'jsonl': JSONLinesReporter,
+    'sarif': SARIFReporter,
+}
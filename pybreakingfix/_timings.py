@@ -0,0 +1,101 @@
+"""time spent in each phase of fixing, in each plugin and in each file
+
+only created with --timings: everything timed takes `Timings | None` so a
+regular run pays for no more than an `is not None` check per phase.
+"""
+from __future__ import annotations
+
+import collections
+import functools
+import heapq
+import time
+from collections.abc import Callable
+from typing import IO
+
+# number of slowest files to report
+SLOWEST_FILES = 10
+
+_PLUGINS_PREFIX = 'pybreakingfix._plugins.'
+
+
+def func_name(func: Callable[..., object]) -> str:
+    """a readable name of a plugin / token callback (or a partial of it, or
+    a wrapper with `__wrapped__`)
+    """
+    while True:
+        if isinstance(func, functools.partial):
+            func = func.func
+        elif hasattr(func, '__wrapped__'):
+            func = func.__wrapped__
+        else:
+            break
+    module = func.__module__.removeprefix(_PLUGINS_PREFIX)
+    return f'{module}.{func.__qualname__}'
+
+
+class Timings:
+    """durations (and counts) by phase and by plugin, summed over files
+
+    phases are timed with `lap(...)`: the time since the previous lap (or
+    `start()`) is added to the phase.  instances are pickled back from the
+    workers and combined with `merge(...)`.
+    """
+
+    def __init__(self) -> None:
+        self.phases: collections.Counter[str] = collections.Counter()
+        self.plugins: collections.Counter[str] = collections.Counter()
+        # number of laps of each phase / calls of each plugin
+        self.calls: collections.Counter[str] = collections.Counter()
+        # min-heap of the (seconds, filename) of the slowest files
+        self.files: list[tuple[float, str]] = []
+        self._last = time.perf_counter()
+
+    def start(self) -> None:
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] += now - self._last
+        self.calls[phase] += 1
+        self._last = now
+
+    def add_plugin(self, name: str, seconds: float) -> None:
+        self.plugins[name] += seconds
+        self.calls[name] += 1
+
+    def add_file(self, filename: str, seconds: float) -> None:
+        if len(self.files) < SLOWEST_FILES:
+            heapq.heappush(self.files, (seconds, filename))
+        else:
+            heapq.heappushpop(self.files, (seconds, filename))
+
+    def merge(self, other: Timings) -> None:
+        self.phases.update(other.phases)
+        self.plugins.update(other.plugins)
+        self.calls.update(other.calls)
+        for seconds, filename in other.files:
+            self.add_file(filename, seconds)
+
+    def _table(
+            self,
+            title: str,
+            rows: list[tuple[str, float]],
+            file: IO[str],
+    ) -> None:
+        width = max((len(name) for name, _ in rows), default=0)
+        width = max(width, len(title))
+        print(f'{title:<{width}} {"calls":>8} {"seconds":>10}', file=file)
+        for name, seconds in rows:
+            calls = self.calls[name] or ''
+            print(f'{name:<{width}} {calls:>8} {seconds:>10.4f}', file=file)
+
+    def report(self, file: IO[str]) -> None:
+        phases = list(self.phases.items())
+        phases.append(('total', sum(self.phases.values())))
+        self._table('phase', phases, file)
+        print(file=file)
+        self._table('plugin / callback', self.plugins.most_common(), file)
+        print(file=file)
+        print('slowest files:', file=file)
+        for seconds, filename in sorted(self.files, reverse=True):
+            print(f'{seconds:>10.4f} {filename}', file=file)
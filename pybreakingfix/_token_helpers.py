@@ -1,11 +1,19 @@
 from __future__ import annotations
 
 import ast
+import bisect
+import collections
+import functools
 import keyword
+from array import array
+from collections.abc import Iterable
 from collections.abc import Sequence
 from typing import NamedTuple
+from typing import overload
+from typing import SupportsIndex
 
 from tokenize_rt import NON_CODING_TOKENS
+from tokenize_rt import Offset
 from tokenize_rt import Token
 from tokenize_rt import tokens_to_src
 from tokenize_rt import UNIMPORTANT_WS
@@ -15,6 +23,222 @@ _CLOSING = frozenset(')]}')
 KEYWORDS = frozenset(keyword.kwlist)
 
 
+class Edit(NamedTuple):
+    start: int
+    end: int
+    new: tuple[Token, ...]
+
+
+class OverlappingEditsError(ValueError):
+    pass
+
+
+def _is_structural(token: Token) -> bool:
+    return token.name == 'NEWLINE' or (
+        token.name == 'OP' and (token.src in _OPENING or token.src in _CLOSING)
+    )
+
+
+class TokenIndex:
+    """lookups into the tokens of a file
+
+    each table is built in a single pass the first time it is needed:
+
+    - `offsets`: the index of the (non-empty) token at each offset
+    - `brackets`: the index of the matching bracket of each bracket
+    - `depths`: the bracket nesting depth at each token
+    - `line_ends`: the indices of the NEWLINE tokens
+    - the indices of every NAME / OP token by its source
+
+    `tokens` is iterated once for each table, its items may be `Token`s or
+    plain `(name, src, line, utf8_byte_offset)` tuples.
+    """
+
+    def __init__(
+            self,
+            tokens: Iterable[tuple[str, str, int | None, int | None]],
+    ) -> None:
+        self._tokens = tokens
+
+    # these are hot: avoid `token.offset` / `is_open(...)` and friends
+
+    @functools.cached_property
+    def offsets(self) -> dict[tuple[int | None, int | None], int]:
+        # keyed by `Offset`s (or equivalent plain tuples)
+        ret: dict[tuple[int | None, int | None], int] = {}
+        for i, (_, src, line, utf8_byte_offset) in enumerate(self._tokens):
+            if src:
+                ret.setdefault((line, utf8_byte_offset), i)
+        return ret
+
+    @functools.cached_property
+    def _occurrences(self) -> dict[tuple[str, str], array[int]]:
+        # (arrays rather than lists: no `int` object for each index)
+        ret: dict[tuple[str, str], array[int]]
+        ret = collections.defaultdict(functools.partial(array, 'I'))
+        for i, (name, src, _, _) in enumerate(self._tokens):
+            if name == 'NAME' or name == 'OP':
+                ret[name, src].append(i)
+        return ret
+
+    @functools.cached_property
+    def _structure(self) -> tuple[dict[int, int], array[int]]:
+        brackets = {}
+        depths = array('I')
+        stack: list[int] = []
+        for i, (name, src, _, _) in enumerate(self._tokens):
+            if name == 'OP':
+                if src in _OPENING:
+                    depths.append(len(stack))
+                    stack.append(i)
+                    continue
+                elif src in _CLOSING and stack:
+                    j = stack.pop()
+                    brackets[i] = j
+                    brackets[j] = i
+            depths.append(len(stack))
+        return brackets, depths
+
+    @property
+    def brackets(self) -> dict[int, int]:
+        return self._structure[0]
+
+    @property
+    def depths(self) -> array[int]:
+        return self._structure[1]
+
+    @functools.cached_property
+    def line_ends(self) -> list[int]:
+        return [
+            i for i, (name, _, _, _) in enumerate(self._tokens)
+            if name == 'NEWLINE'
+        ]
+
+    def replaced(self, i: int, old: Token, new: Token) -> None:
+        """update for `new` replacing `old` (neither a bracket / NEWLINE)"""
+        if 'offsets' in self.__dict__:
+            if self.offsets.get(old.offset) == i:
+                del self.offsets[old.offset]
+            if new.src:
+                self.offsets.setdefault(new.offset, i)
+
+        if '_occurrences' in self.__dict__:
+            old_indices = self._occurrences.get((old.name, old.src))
+            if old_indices is not None:
+                del old_indices[bisect.bisect_left(old_indices, i)]
+            if new.name == 'NAME' or new.name == 'OP':
+                bisect.insort(self._occurrences[new.name, new.src], i)
+
+    def find(self, i: int, name: str, src: str) -> int | None:
+        """the index of the first `name` token matching `src` from `i`"""
+        indices = self._occurrences.get((name, src), ())
+        pos = bisect.bisect_left(indices, i)
+        if pos < len(indices):
+            return indices[pos]
+        else:
+            return None
+
+    def find_same_depth(self, i: int, name: str, src: str) -> int | None:
+        """like `find` but skipping over anything in (nested) brackets"""
+        indices = self._occurrences.get((name, src), ())
+        depth = self.depths[i]
+        for pos in range(bisect.bisect_left(indices, i), len(indices)):
+            j = indices[pos]
+            if self.depths[j] == depth:
+                return j
+            elif self.depths[j] < depth:  # left the enclosing brackets
+                return None
+        return None
+
+    def line_end(self, i: int) -> int:
+        """the index of the NEWLINE ending the logical line containing `i`"""
+        return self.line_ends[bisect.bisect_left(self.line_ends, i)]
+
+
+class Tokens(list[Token]):
+    """the tokens of a file along with the edits to make to them
+
+    this is all the state of fixing a single file: plugins must not keep
+    any themselves so that files may be fixed concurrently.
+
+    instead of splicing the list (which is linear in the length of the file,
+    so quadratic for a file with many fixes) callbacks record replacements
+    of ranges of tokens.  the indices of the tokens therefore never change
+    and all the edits are applied in a single pass by `src()`.  a single
+    token may still be replaced in place with `tokens[i] = ...`.
+
+    `token_index` is built the first time it is needed and kept up to date
+    with replacements made in place.
+
+    `imports` are the names to import (by module) at the top of the file
+    once it is fixed, recorded with `add_import(...)`.
+    """
+
+    def __init__(self, tokens: Iterable[Token] = ()) -> None:
+        super().__init__(tokens)
+        self.edits: list[Edit] = []
+        self.imports: dict[str, set[str]] = collections.defaultdict(set)
+        self._index: TokenIndex | None = None
+
+    @property
+    def token_index(self) -> TokenIndex:
+        if self._index is None:
+            self._index = TokenIndex(self)
+        return self._index
+
+    @overload
+    def __setitem__(self, i: SupportsIndex, token: Token) -> None: ...
+    @overload
+    def __setitem__(self, i: slice, token: Iterable[Token]) -> None: ...
+
+    def __setitem__(
+            self,
+            i: SupportsIndex | slice,
+            token: Token | Iterable[Token],
+    ) -> None:
+        if isinstance(i, slice) or not isinstance(token, Token):
+            raise TypeError('use `.replace(...)` to replace multiple tokens')
+
+        i = i.__index__()
+        if self._index is not None:
+            old = self[i]
+            if _is_structural(old) or _is_structural(token):
+                self._index = None
+            else:
+                self._index.replaced(i % len(self), old, token)
+        self._store(i, token)
+
+    def _store(self, i: int, token: Token) -> None:
+        super().__setitem__(i, token)
+
+    def replace(self, start: int, end: int, new: Iterable[Token]) -> None:
+        """replace `tokens[start:end]` with `new` (an insertion if empty)"""
+        self.edits.append(Edit(start, end, tuple(new)))
+
+    def add_import(self, module: str, name: str) -> None:
+        """add `from {module} import {name}` to the fixed file"""
+        self.imports[module].add(name)
+
+    def src(self) -> str:
+        parts: list[str] = []
+        pos = 0
+        for edit in sorted(self.edits, key=lambda edit: edit[:2]):
+            if edit.start < pos:
+                raise OverlappingEditsError(
+                    f'edit of tokens {edit.start}:{edit.end} overlaps with a '
+                    f'previous edit ending at {pos}',
+                )
+            parts.extend(self._srcs(pos, edit.start))
+            parts.extend(token.src for token in edit.new)
+            pos = edit.end
+        parts.extend(self._srcs(pos, len(self)))
+        return ''.join(parts)
+
+    def _srcs(self, start: int, end: int) -> Iterable[str]:
+        """the sources of `self[start:end]`"""
+        return (token.src for token in self[start:end])
+
+
 def immediately_paren(func: str, tokens: list[Token], i: int) -> bool:
     return tokens[i].src == func and tokens[i + 1].src == '('
 
@@ -34,17 +258,18 @@ def is_close(token: Token) -> bool:
     return token.name == 'OP' and token.src in _CLOSING
 
 
-def _find_token(tokens: list[Token], i: int, name: str, src: str) -> int:
-    while not tokens[i].matches(name=name, src=src):
-        i += 1
-    return i
+def _find_token(tokens: Tokens, i: int, name: str, src: str) -> int:
+    ret = tokens.token_index.find(i, name, src)
+    if ret is None:
+        raise IndexError(f'no {name} {src!r} after token {i}')
+    return ret
 
 
-def find_name(tokens: list[Token], i: int, src: str) -> int:
+def find_name(tokens: Tokens, i: int, src: str) -> int:
     return _find_token(tokens, i, 'NAME', src)
 
 
-def find_op(tokens: list[Token], i: int, src: str) -> int:
+def find_op(tokens: Tokens, i: int, src: str) -> int:
     return _find_token(tokens, i, 'OP', src)
 
 
@@ -62,17 +287,12 @@ def find_call(tokens: list[Token], i: int) -> int:
     return i
 
 
-def find_end(tokens: list[Token], i: int) -> int:
-    while tokens[i].name != 'NEWLINE':
-        i += 1
-
-    return i + 1
+def find_end(tokens: Tokens, i: int) -> int:
+    return tokens.token_index.line_end(i) + 1
 
 
-def _arg_token_index(tokens: list[Token], i: int, arg: ast.expr) -> int:
-    offset = (arg.lineno, arg.col_offset)
-    while tokens[i].offset != offset:
-        i += 1
+def _arg_token_index(tokens: Tokens, i: int, arg: ast.expr) -> int:
+    i = tokens.token_index.offsets[Offset(arg.lineno, arg.col_offset)]
     i += 1
     while tokens[i].name in NON_CODING_TOKENS:
         i += 1
@@ -80,7 +300,7 @@ def _arg_token_index(tokens: list[Token], i: int, arg: ast.expr) -> int:
 
 
 def victims(
-        tokens: list[Token],
+        tokens: Tokens,
         start: int,
         arg: ast.expr,
         gen: bool,
@@ -142,28 +362,15 @@ def victims(
     return Victims(starts, sorted(set(ends)), first_comma_index, arg_index)
 
 
-def find_closing_bracket(tokens: list[Token], i: int) -> int:
+def find_closing_bracket(tokens: Tokens, i: int) -> int:
     assert tokens[i].src in _OPENING
-    depth = 1
-    i += 1
-    while depth:
-        if is_open(tokens[i]):
-            depth += 1
-        elif is_close(tokens[i]):
-            depth -= 1
-        i += 1
-    return i - 1
+    return tokens.token_index.brackets[i]
 
 
-def find_block_start(tokens: list[Token], i: int) -> int:
-    depth = 0
-    while depth or not tokens[i].matches(name='OP', src=':'):
-        if is_open(tokens[i]):
-            depth += 1
-        elif is_close(tokens[i]):
-            depth -= 1
-        i += 1
-    return i
+def find_block_start(tokens: Tokens, i: int) -> int:
+    ret = tokens.token_index.find_same_depth(i, 'OP', ':')
+    assert ret is not None
+    return ret
 
 
 class Block(NamedTuple):
@@ -212,11 +419,11 @@ class Block(NamedTuple):
                 s = s[:initial_indent] + s[initial_indent + diff:]
                 tokens[i] = tokens[i]._replace(src=s)
 
-    def replace_condition(self, tokens: list[Token], new: list[Token]) -> None:
+    def replace_condition(self, tokens: Tokens, new: list[Token]) -> None:
         start = self.start
         while tokens[start].name == 'UNIMPORTANT_WS':
             start += 1
-        tokens[start:self.colon] = new
+        tokens.replace(start, self.colon, new)
 
     def _trim_end(self, tokens: list[Token]) -> Block:
         """the tokenizer reports the end of the block at the beginning of
@@ -240,7 +447,7 @@ class Block(NamedTuple):
     @classmethod
     def find(
             cls,
-            tokens: list[Token],
+            tokens: Tokens,
             i: int,
             trim_end: bool = False,
     ) -> Block:
@@ -284,14 +491,14 @@ def _is_on_a_line_by_self(tokens: list[Token], i: int) -> bool:
     )
 
 
-def remove_brace(tokens: list[Token], i: int) -> None:
+def remove_brace(tokens: Tokens, i: int) -> None:
     if _is_on_a_line_by_self(tokens, i):
-        del tokens[i - 1:i + 2]
+        tokens.replace(i - 1, i + 2, ())
     else:
-        del tokens[i]
+        tokens.replace(i, i + 1, ())
 
 
-def remove_base_class(i: int, tokens: list[Token]) -> None:
+def remove_base_class(i: int, tokens: Tokens) -> None:
     # look forward and backward to find commas / parens
     brace_stack = []
     j = i
@@ -330,19 +537,19 @@ def remove_base_class(i: int, tokens: list[Token]) -> None:
 
     # single base, remove the entire bases
     if tokens[left].src == '(' and tokens[right].src == ':':
-        del tokens[left:right]
+        tokens.replace(left, right, ())
     # multiple bases, base is first
     elif tokens[left].src == '(' and tokens[right].src != ':':
         # if there's space / comment afterwards remove that too
         while tokens[right + 1].name in {UNIMPORTANT_WS, 'COMMENT'}:
             right += 1
-        del tokens[left + 1:right + 1]
+        tokens.replace(left + 1, right + 1, ())
     # multiple bases, base is not first
     else:
-        del tokens[left:last_part + 1]
+        tokens.replace(left, last_part + 1, ())
 
 
-def remove_decorator(i: int, tokens: list[Token]) -> None:
+def remove_decorator(i: int, tokens: Tokens) -> None:
     while tokens[i - 1].src != '@':
         i -= 1
     if i > 1 and tokens[i - 2].name not in {'NEWLINE', 'NL'}:
@@ -350,7 +557,7 @@ def remove_decorator(i: int, tokens: list[Token]) -> None:
     end = i + 1
     while tokens[end].name != 'NEWLINE':
         end += 1
-    del tokens[i - 1:end + 1]
+    tokens.replace(i - 1, end + 1, ())
 
 
 def parse_call_args(
@@ -402,7 +609,7 @@ def _arg_contains_newline(tokens: list[Token], start: int, end: int) -> bool:
 
 
 def replace_call(
-        tokens: list[Token],
+        tokens: Tokens,
         start: int,
         end: int,
         args: list[tuple[int, int]],
@@ -436,12 +643,12 @@ def replace_call(
 
     rest = tokens_to_src(tokens[start_rest:end_rest])
     src = tmpl.format(args=arg_strs, rest=rest)
-    tokens[start:end] = [Token('CODE', src)]
+    tokens.replace(start, end, (Token('CODE', src),))
 
 
 def find_and_replace_call(
         i: int,
-        tokens: list[Token],
+        tokens: Tokens,
         *,
         template: str,
         parens: tuple[int, ...] = (),
@@ -451,7 +658,7 @@ def find_and_replace_call(
     replace_call(tokens, i, end, func_args, template, parens=parens)
 
 
-def replace_name(i: int, tokens: list[Token], *, name: str, new: str) -> None:
+def replace_name(i: int, tokens: Tokens, *, name: str, new: str) -> None:
     # preserve token offset in case we need to match it later
     new_token = tokens[i]._replace(name='CODE', src=new)
     j = i
@@ -460,11 +667,11 @@ def replace_name(i: int, tokens: list[Token], *, name: str, new: str) -> None:
         if tokens[j].src == ')':
             return
         j += 1
-    tokens[i:j + 1] = [new_token]
+    tokens.replace(i, j + 1, (new_token,))
 
 
 def delete_argument(
-        i: int, tokens: list[Token],
+        i: int, tokens: Tokens,
         func_args: Sequence[tuple[int, int]],
 ) -> None:
     if i == 0:
@@ -473,14 +680,14 @@ def delete_argument(
         while tokens[end_idx].name == 'UNIMPORTANT_WS':
             end_idx += 1
 
-        del tokens[func_args[i][0]:end_idx]
+        tokens.replace(func_args[i][0], end_idx, ())
     else:
-        del tokens[func_args[i - 1][1]:func_args[i][1]]
+        tokens.replace(func_args[i - 1][1], func_args[i][1], ())
 
 
 def replace_argument(
         i: int,
-        tokens: list[Token],
+        tokens: Tokens,
         func_args: Sequence[tuple[int, int]],
         *,
         new: str,
@@ -489,10 +696,10 @@ def replace_argument(
     # don't replace leading whitespace / newlines
     while tokens[start_idx].name in {'UNIMPORTANT_WS', 'NL'}:
         start_idx += 1
-    tokens[start_idx:end_idx] = [Token('SRC', new)]
+    tokens.replace(start_idx, end_idx, (Token('SRC', new),))
 
 
-def constant_fold_tuple(i: int, tokens: list[Token]) -> None:
+def constant_fold_tuple(i: int, tokens: Tokens) -> None:
     start = find_op(tokens, i, '(')
     func_args, end = parse_call_args(tokens, start)
     arg_strs = [_arg_str_no_comment(tokens, *arg) for arg in func_args]
@@ -506,7 +713,7 @@ def constant_fold_tuple(i: int, tokens: list[Token]) -> None:
     else:
         joined = unique_args[0]
 
-    tokens[start:end] = [Token('CODE', joined)]
+    tokens.replace(start, end, (Token('CODE', joined),))
 
 
 def has_space_before(i: int, tokens: list[Token]) -> bool:
@@ -517,7 +724,8 @@ def indented_amount(i: int, tokens: list[Token]) -> str:
     if i == 0:
         return ''
     elif has_space_before(i, tokens):
-        if i >= 2 and tokens[i - 2].name in {'NL', 'NEWLINE', 'DEDENT'}:
+        # (the tokens of a statement start with its line)
+        if i < 2 or tokens[i - 2].name in {'NL', 'NEWLINE', 'DEDENT'}:
             return tokens[i - 1].src
         else:  # inline import
             raise ValueError('not at beginning of line')
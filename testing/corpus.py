@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""generate synthetic sources which scale along a single axis
+
+usage: testing/corpus.py AXIS N DIRECTORY
+
+the axes (see `AXES`) are:
+
+- `size`: N lines of code not needing any fix, around a single fix site
+- `sites`: N fix sites (of each plugin in turn) in one file
+- `depth`: N nested blocks, with a fix site at each level
+- `line-length`: a single logical line of N elements, each one a fix site
+- `files`: N files of the same size
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from collections.abc import Callable
+
+# one of each kind of fix, they are used in turn
+SITES = (
+    'x{i} = isinstance(y, collections.Sized)\n',
+    'x{i} = base64.encodestring(y)\n',
+    'x{i} = fractions.gcd(y, {i})\n',
+    'x{i} = asyncio.Task.current_task()\n',
+)
+HEADER = (
+    'import asyncio\n'
+    'import base64\n'
+    'import collections\n'
+    'import fractions\n'
+    'from collections import Mapping, OrderedDict\n'
+)
+
+
+def size(n: int) -> str:
+    body = ''.join(
+        f'def f{i}(a, b={i}):\n'
+        f'    return [c * b for c in a if c != "{i}"]\n'
+        for i in range(n // 2)
+    )
+    return f'{HEADER}{body}{SITES[0].format(i=0)}'
+
+
+def sites(n: int) -> str:
+    return HEADER + ''.join(
+        SITES[i % len(SITES)].format(i=i) for i in range(n)
+    )
+
+
+def depth(n: int) -> str:
+    # the tokenizer allows at most 100 levels of indentation
+    if n > 99:
+        raise ValueError(f'depth must be at most 99, got {n}')
+    return HEADER + ''.join(
+        f'{"    " * i}x{i} = collections.Sized\n'
+        f'{"    " * i}if x{i}:\n'
+        for i in range(n)
+    ) + f'{"    " * n}pass\n'
+
+
+def line_length(n: int) -> str:
+    elements = ', '.join(f'collections.Sized, {i}' for i in range(n))
+    return f'{HEADER}x = [{elements}]\n'
+
+
+def files(n: int) -> list[str]:
+    return [sites(20) for _ in range(n)]
+
+
+# axis -> (generator of the sources for N, base N)
+AXES: dict[str, tuple[Callable[[int], str | list[str]], int]] = {
+    'size': (size, 2000),
+    'sites': (sites, 500),
+    'depth': (depth, 6),
+    'line-length': (line_length, 500),
+    'files': (files, 25),
+}
+
+
+def sources(axis: str, n: int) -> list[str]:
+    ret = AXES[axis][0](n)
+    return [ret] if isinstance(ret, str) else ret
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('axis', choices=AXES)
+    parser.add_argument('n', type=int)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for i, src in enumerate(sources(args.axis, args.n)):
+        with open(os.path.join(args.directory, f'f{i}.py'), 'w') as f:
+            f.write(src)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import base64
+import io
+import json
+import sys
+from unittest import mock
+
+import pytest
+
+from pybreakingfix import _batch
+from pybreakingfix._main import main
+
+
+def _record(filename, source):
+    record = {
+        'filename': filename,
+        'source': base64.b64encode(source).decode(),
+    }
+    return f'{json.dumps(record)}\n'
+
+
+def _run_batch(capsys, lines, *args):
+    stdin = io.TextIOWrapper(io.BytesIO(''.join(lines).encode()))
+    with mock.patch.object(sys, 'stdin', stdin):
+        ret = main(('--batch', *args))
+    out, err = capsys.readouterr()
+    return ret, [json.loads(line) for line in out.splitlines()]
+
+
+def test_batch(capsys):
+    ret, results = _run_batch(
+        capsys,
+        (
+            _record('a.py', b'from collections import Mapping\n'),
+            _record('b.py', b'x = 1\n'),
+            '\n',
+            _record('c.py', b'arr.tostring()\n'),
+        ),
+    )
+    assert ret == 1
+    assert results == [
+        {
+            'filename': 'a.py',
+            'ret': 1,
+            'source': base64.b64encode(
+                b'from collections.abc import Mapping\n',
+            ).decode(),
+            'messages': [{
+                'line': 1,
+                'col': 0,
+                'rule': 'collections-abc',
+                'severity': 'fix',
+                'args': [],
+            }],
+        },
+        {'filename': 'b.py', 'ret': 0, 'source': None, 'messages': []},
+        {
+            'filename': 'c.py',
+            'ret': 0,
+            'source': None,
+            'messages': [{
+                'line': 1,
+                'col': 0,
+                'rule': 'potential-deprecated-method',
+                'severity': 'warning',
+                'args': [
+                    'tostring',
+                    'array.array',
+                    '.tobytes()',
+                    'etree',
+                ],
+            }],
+        },
+    ]
+
+
+def test_batch_fatal_and_check(capsys):
+    ret, results = _run_batch(
+        capsys,
+        (
+            _record('a.py', b'from collections import Mapping\n'),
+            _record('b.py', b'import imp\n'),
+        ),
+        '--check',
+    )
+    assert ret == 2
+    assert [(r['ret'], r['source']) for r in results] == [(1, None), (2, None)]
+    assert results[1]['messages'][0]['rule'] == 'removed-module'
+
+
+@pytest.mark.parametrize(
+    ('line', 'filename'),
+    (
+        ('not json', None),
+        ('[]', None),
+        ('{"filename": "a.py"}', 'a.py'),
+        ('{"filename": "a.py", "source": "%%%"}', 'a.py'),
+    ),
+)
+def test_batch_bad_record(capsys, line, filename):
+    ret, results = _run_batch(
+        capsys, (f'{line}\n', _record('b.py', b'x = 1\n')),
+    )
+    assert ret == 2
+    assert results[0]['filename'] == filename
+    assert results[0]['error'].startswith('bad record: ')
+    assert results[1] == {
+        'filename': 'b.py', 'ret': 0, 'source': None, 'messages': [],
+    }
+
+
+def test_batch_streams_results():
+    stdout = io.StringIO()
+    stdin = io.BytesIO(
+        (_record('a.py', b'x = 1\n') + _record('b.py', b'y = 2\n')).encode(),
+    )
+    rets = _batch.run(
+        stdin, stdout, lambda filename, b: (0, [], None), check=False,
+    )
+    assert next(rets) == 0
+    # the first result is written before the second record is read
+    assert json.loads(stdout.getvalue())['filename'] == 'a.py'
+    assert list(rets) == [0]
+
+
+def test_batch_timings(capsys):
+    lines = (
+        _record('a.py', b'from collections import Sized\n'),
+        json.dumps({'source': base64.b64encode(b'x = 1\n').decode()}) + '\n',
+    )
+    stdin = io.TextIOWrapper(io.BytesIO(''.join(lines).encode()))
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('--batch', '--no-cache', '--timings')) == 1
+    out, err = capsys.readouterr()
+    slowest = err[err.index('slowest files:'):].splitlines()[1:]
+    assert sorted(line.split()[-1] for line in slowest) == ['-', 'a.py']
+
+
+def test_batch_with_filenames(capsys):
+    with pytest.raises(SystemExit):
+        main(('--batch', 'f.py'))
+    out, err = capsys.readouterr()
+    assert '--batch reads the sources to fix from stdin' in err
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+from unittest import mock
+
+from pybreakingfix import _main
+from pybreakingfix._cache import Cache
+from pybreakingfix._cache import default_cache_dir
+from pybreakingfix._cache import ruleset_key
+from pybreakingfix._data import Message
+from pybreakingfix._data import Settings
+from pybreakingfix._main import main
+
+
+def _run_twice(capsys, *argv):
+    ret1 = main(argv)
+    out1 = capsys.readouterr()
+    with mock.patch.object(
+        _main, '_fix_contents', wraps=_main._fix_contents,
+    ) as fix_contents_mock:
+        ret2 = main(argv)
+    out2 = capsys.readouterr()
+    return (ret1, out1), (ret2, out2), fix_contents_mock.call_count
+
+
+def test_cache_warm_run_reports_the_same(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('import imp\narr.tostring()\n')
+    g = tmpdir.join('g.py')
+    g.write('arr.tostring()\nfrom collections import Mapping\n')
+
+    cold, warm, calls = _run_twice(capsys, f.strpath, g.strpath, '--check')
+    assert cold == warm
+    assert cold[0] == 2
+    assert calls == 0
+
+
+def test_cache_content_changed(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('from collections.abc import Mapping\n')
+    assert main((f.strpath,)) == 0
+    f.write('from collections import Mapping\n')
+    assert main((f.strpath,)) == 1
+    assert f.read() == 'from collections.abc import Mapping\n'
+    assert main((f.strpath,)) == 0
+
+
+def test_cache_content_digest_fallback(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('from collections import Mapping\n')
+    assert main((f.strpath, '--check')) == 1
+    g = tmpdir.join('g.py')
+    g.write('from collections import Mapping\n')
+    with mock.patch.object(_main, '_fix_contents') as fix_contents_mock:
+        assert main((g.strpath, '--check')) == 1
+    assert not fix_contents_mock.called
+
+
+def test_no_cache(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('from collections import Mapping\n')
+    assert main((f.strpath, '--check', '--no-cache')) == 1
+    assert not os.path.exists(os.path.join(default_cache_dir(), 'cache.db'))
+
+
+def test_unusable_cache_dir(tmpdir, capsys):
+    not_a_dir = tmpdir.join('file')
+    not_a_dir.write('')
+    f = tmpdir.join('f.py')
+    f.write('from collections import Mapping\n')
+    argv = (f.strpath, '--check', '--cache-dir', not_a_dir.strpath)
+    assert main(argv) == 1
+    out, err = capsys.readouterr()
+    assert 'not using cache' in err
+
+
+def test_ruleset_key_depends_on_settings():
+    assert ruleset_key(Settings()) == ruleset_key(Settings())
+    assert ruleset_key(Settings()) != ruleset_key(Settings((3, 8)))
+
+
+def test_cache_roundtrip_and_evict(tmpdir):
+    cache = Cache.open(tmpdir.strpath, 'ruleset')
+    try:
+        msg = Message(1, 0, 'removed-module', 'error', ('imp', 'Use it'))
+        cache.put('a', (2, [msg], None))
+        cache.put('b', (1, [], b'x' * 1000))
+        assert cache.get('a') == (2, [msg], None)
+        assert cache.get('b') == (1, [], b'x' * 1000)
+        assert cache.get('c') is None
+
+        # `a` is the most recently used, `b` gets evicted
+        cache.get('a')
+        cache.evict(max_size=500)
+        assert cache.get('a') is not None
+        assert cache.get('b') is None
+    finally:
+        cache.close()
+
+
+def test_cache_other_ruleset(tmpdir):
+    cache = Cache.open(tmpdir.strpath, 'ruleset')
+    try:
+        cache.put('a', (0, [], None))
+    finally:
+        cache.close()
+    cache = Cache.open(tmpdir.strpath, 'other')
+    try:
+        assert cache.get('a') is None
+    finally:
+        cache.close()
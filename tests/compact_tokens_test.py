@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import tokenize
+
+import pytest
+from tokenize_rt import src_to_tokens
+from tokenize_rt import Token
+
+from pybreakingfix._compact_tokens import CompactTokens
+from pybreakingfix._token_helpers import find_closing_bracket
+from pybreakingfix._token_helpers import find_end
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param('', id='empty'),
+        pytest.param('x = (1, 2)\n', id='trivial'),
+        pytest.param('x = 1', id='no newline at eof'),
+        pytest.param('x = 1\r\ny = 2\r\n', id='crlf'),
+        pytest.param('x = 1\ry = 2\r', id='cr'),
+        pytest.param('s = "☃"; t = "☃☃"\n', id='non-ascii'),
+        pytest.param('x = (  # ☃\n\t1,\n)\n', id='comment and tab'),
+        pytest.param('x = 1 + \\\n    2\n', id='escaped newline'),
+        pytest.param('x = 1\\\n\\\n\n', id='escaped newlines'),
+        pytest.param('if x:\n    pass\n\\\n\n', id='escaped newline alone'),
+        pytest.param('x = """\n☃\n""" ; y\n', id='multi-line string'),
+        pytest.param(
+            'if x:\n'
+            '    if y:\n'
+            '        pass\n'
+            '    else:\n'
+            '        pass\n',
+            id='dedents',
+        ),
+        pytest.param('f"{x!r:>{w}} {{}}"\n', id='f-string'),
+        pytest.param('\ufeffx = 1\n', id='bom'),
+        pytest.param('\x0cx = 1\n', id='form feed'),
+    ),
+)
+def test_compact_tokens_match_src_to_tokens(s):
+    expected = src_to_tokens(s)
+    tokens = CompactTokens(s)
+    assert len(tokens) == len(expected)
+    assert list(tokens) == expected
+    assert list(reversed(tokens)) == expected[::-1]
+    assert [tokens[i] for i in range(len(tokens))] == expected
+    assert tokens == expected
+    assert tokens.src() == s
+
+
+def test_compact_tokens_segment():
+    text = 'x = 1\ny = (\n    2,\n)\nz = 3\n'
+    start = text.index('y')
+    end = text.index('z')
+    tokens = CompactTokens(text, start, end)
+    assert tokens == src_to_tokens(text[start:end])
+    assert tokens.src() == 'y = (\n    2,\n)\n'
+
+
+def test_compact_tokens_indexing():
+    tokens = CompactTokens('a = b\n')
+    expected = src_to_tokens('a = b\n')
+    assert tokens[-1] == expected[-1]
+    assert tokens[1:4] == expected[1:4]
+    assert tokens[::-2] == expected[::-2]
+    assert tokens != tuple(expected)
+    assert repr(tokens) == f'CompactTokens({expected!r})'
+    with pytest.raises(IndexError):
+        tokens[len(tokens)]
+    with pytest.raises(IndexError):
+        tokens[-len(tokens) - 1]
+
+
+def test_compact_tokens_in_place_replacement_and_edits():
+    tokens = CompactTokens('a = b + c\nd = e\n')
+    tokens[0] = tokens[0]._replace(src='eh')
+    tokens[-3] = tokens[-3]._replace(src='ee')
+    tokens.replace(4, 5, (Token('CODE', 'bee'),))
+    assert tokens[0].src == 'eh'
+    assert [token.src for token in tokens][:3] == ['eh', ' ', '=']
+    assert tokens.src() == 'eh = bee + c\nd = ee\n'
+
+
+def test_compact_tokens_refuses_splicing():
+    tokens = CompactTokens('a = b\n')
+    with pytest.raises(TypeError):
+        tokens[0:1] = [Token('CODE', 'eh')]
+    with pytest.raises(IndexError):
+        tokens[len(tokens)] = Token('CODE', 'eh')
+
+
+def test_compact_tokens_token_index():
+    tokens = CompactTokens('x = f([1], {2: 3})\ncollections.Sized\n')
+    assert find_closing_bracket(tokens, 5) == 17
+    assert tokens[find_end(tokens, 0)].src == 'collections'
+    assert tokens.token_index.find(0, 'NAME', 'collections') == 19
+    tokens[19] = tokens[19]._replace(src='abc')
+    assert tokens.token_index.find(0, 'NAME', 'collections') is None
+    assert tokens.token_index.find(0, 'NAME', 'abc') == 19
+    assert tokens.token_index.offsets[tokens[21].offset] == 21
+
+
+def test_compact_tokens_error():
+    with pytest.raises(tokenize.TokenError):
+        CompactTokens('x = (\n')
@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(tmp_path_factory, monkeypatch):
+    cache_dir = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv('PYBREAKINGFIX_CACHE_DIR', str(cache_dir))
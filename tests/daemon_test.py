@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import functools
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from pybreakingfix import _daemon
+from pybreakingfix import _main
+from pybreakingfix._main import main
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, 'AF_UNIX'), reason='requires unix sockets',
+)
+
+
+@pytest.fixture
+def daemon(tmp_path_factory, monkeypatch):
+    path = str(tmp_path_factory.mktemp('d') / 's')
+    monkeypatch.setenv('PYBREAKINGFIX_DAEMON_SOCKET', path)
+    run = functools.partial(_main._main, in_daemon=True)
+    thread = threading.Thread(target=_daemon.serve, args=(path, run))
+    thread.start()
+    # (the socket exists a moment before the daemon listens on it)
+    while True:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(path)
+            except OSError:
+                time.sleep(.001)
+            else:
+                break
+    try:
+        yield path
+    finally:
+        # a request from a "different version" stops the daemon
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps({'stamp': -1}).encode())
+            sock.shutdown(socket.SHUT_WR)
+        thread.join()
+    assert not os.path.exists(path)
+
+
+def test_daemon_forwards_requests(daemon, tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('from collections import Mapping\narr.tostring()\n')
+    with mock.patch.object(_main, '_main') as in_process_mock:
+        assert main((f.strpath,)) == 1
+    assert not in_process_mock.called
+    out, err = capsys.readouterr()
+    assert 'WARNING: .tostring()' in err
+    assert f'Rewriting {f.strpath}' in err
+    assert f.read() == 'from collections.abc import Mapping\narr.tostring()\n'
+
+
+def test_daemon_relative_paths_use_client_cwd(daemon, tmpdir, capsys):
+    tmpdir.join('f.py').write('import imp\n')
+    with tmpdir.as_cwd():
+        assert main(('f.py',)) == 2
+    out, err = capsys.readouterr()
+    assert 'f.py:1: ERROR: module "imp" has been removed' in err
+
+
+def test_daemon_stdin(daemon, capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'from collections import Sized\n'))
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('-',)) == 1
+    out, err = capsys.readouterr()
+    assert out == 'from collections.abc import Sized\n'
+
+
+def test_daemon_usage_error(daemon, capsys):
+    assert main(('--jobs', 'notanumber')) == 2
+    out, err = capsys.readouterr()
+    assert 'pybreakingfix: error: argument --jobs/-j: invalid int value' in err
+
+
+def test_daemon_uses_client_environment(daemon, tmpdir, monkeypatch):
+    f = tmpdir.join('f.py')
+    f.write('from collections import Sized\n')
+    cache_dir = tmpdir.join('cache').strpath
+    monkeypatch.setenv('PYBREAKINGFIX_CACHE_DIR', cache_dir)
+    with (
+            mock.patch.object(
+                _daemon, '_environ', wraps=_daemon._environ,
+            ) as environ_mock,
+            mock.patch.object(_main, '_main') as in_process_mock,
+    ):
+        assert main((f.strpath, '--check')) == 1
+    assert not in_process_mock.called
+    (env,), _ = environ_mock.call_args
+    assert env['PYBREAKINGFIX_CACHE_DIR'] == cache_dir
+
+
+def test_environ_restores_environment(monkeypatch):
+    monkeypatch.setenv('PYBREAKINGFIX_A', 'daemon')
+    monkeypatch.setenv('XDG_CACHE_HOME', 'daemon')
+    monkeypatch.delenv('PYBREAKINGFIX_B', raising=False)
+    with _daemon._environ({'PYBREAKINGFIX_B': 'client'}):
+        assert 'PYBREAKINGFIX_A' not in os.environ
+        assert 'XDG_CACHE_HOME' not in os.environ
+        assert os.environ['PYBREAKINGFIX_B'] == 'client'
+    assert os.environ['PYBREAKINGFIX_A'] == 'daemon'
+    assert os.environ['XDG_CACHE_HOME'] == 'daemon'
+    assert 'PYBREAKINGFIX_B' not in os.environ
+
+
+def test_daemon_single_file_ignores_jobs(daemon, tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('from collections import Sized\n')
+    with mock.patch.object(_main, '_main') as in_process_mock:
+        assert main((f.strpath, '--jobs=4')) == 1
+    assert not in_process_mock.called
+    assert f.read() == 'from collections.abc import Sized\n'
+
+
+@pytest.mark.parametrize('paths', (('f.py', 'g.py'), ('.',)))
+def test_daemon_declines_parallel_runs(daemon, tmpdir, paths):
+    tmpdir.join('f.py').write('x = 1\n')
+    tmpdir.join('g.py').write('x = 1\n')
+    with tmpdir.as_cwd():
+        with mock.patch.object(
+                _main, '_main', return_value=0,
+        ) as in_process_mock:
+            assert main(('--jobs=2', *paths)) == 0
+    in_process_mock.assert_called_once_with(('--jobs=2', *paths))
+
+
+def test_daemon_not_answering_is_fatal(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 's')
+    monkeypatch.setenv('PYBREAKINGFIX_DAEMON_SOCKET', path)
+    monkeypatch.setattr(_daemon, 'RESPONSE_TIMEOUT', .01)
+    stdin = io.TextIOWrapper(io.BytesIO(b'from collections import Sized\n'))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+        sock.listen()  # but never accepts
+        with (
+                mock.patch.object(sys, 'stdin', stdin),
+                mock.patch.object(_main, '_main') as in_process_mock,
+        ):
+            assert main(('-',)) == 2
+    assert not in_process_mock.called
+    out, err = capsys.readouterr()
+    assert 'the daemon did not answer within 0.01s' in err
+
+
+def test_stamp_covers_the_package(tmp_path, monkeypatch):
+    package = tmp_path / 'pkg'
+    (package / 'sub').mkdir(parents=True)
+    (package / 'a.py').write_text('x = 1\n')
+    (package / 'sub' / 'b.py').write_text('x = 1\n')
+    monkeypatch.setattr(_daemon, '__file__', str(package / 'a.py'))
+    before = _daemon._stamp()
+    (package / 'sub' / 'b.py').write_text('x = 12\n')
+    assert _daemon._stamp() != before
+
+
+def test_no_daemon_runs_in_process(daemon, tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = 1\n')
+    with mock.patch.object(_main, '_main', return_value=0) as in_process_mock:
+        assert main((f.strpath, '--no-daemon')) == 0
+    assert in_process_mock.called
+
+
+def test_stale_socket_falls_back_in_process(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 's'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(str(path))
+    monkeypatch.setenv('PYBREAKINGFIX_DAEMON_SOCKET', str(path))
+    stdin = io.TextIOWrapper(io.BytesIO(b'x = 1\n'))
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('-',)) == 0
+    out, err = capsys.readouterr()
+    assert out == 'x = 1\n'
+
+
+def test_daemon_already_running(daemon, capsys):
+    assert _daemon.serve(daemon, _main._main) == 1
+    out, err = capsys.readouterr()
+    assert 'already running' in err
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+import subprocess
+
+import pytest
+
+from pybreakingfix._discovery import compile_excludes
+from pybreakingfix._discovery import DEFAULT_EXCLUDES
+from pybreakingfix._discovery import expand_paths
+from pybreakingfix._discovery import filter_paths
+from pybreakingfix._discovery import git_changed_files
+from pybreakingfix._discovery import GitIgnore
+
+
+@pytest.mark.parametrize(
+    ('pattern', 'path', 'is_dir', 'expected'),
+    (
+        ('*.py', 'f.py', False, True),
+        ('*.py', 'a/b/f.py', False, True),
+        ('*.py', 'f.pyi', False, None),
+        ('/f.py', 'f.py', False, True),
+        ('/f.py', 'a/f.py', False, None),
+        ('a/*.py', 'a/f.py', False, True),
+        ('a/*.py', 'a/b/f.py', False, None),
+        ('a/**/f.py', 'a/b/c/f.py', False, True),
+        ('**/gen', 'x/gen', True, True),
+        ('gen/', 'x/gen', True, True),
+        ('gen/', 'x/gen', False, None),
+        ('*.py[co]', 'f.pyc', False, True),
+        ('f[!a].py', 'fa.py', False, None),
+        ('f[!a].py', 'fb.py', False, True),
+        ('# comment', '# comment', False, None),
+    ),
+)
+def test_gitignore_match(pattern, path, is_dir, expected):
+    assert GitIgnore.parse(pattern).match(path, is_dir) is expected
+
+
+def test_gitignore_negation_last_match_wins():
+    gitignore = GitIgnore.parse('*.py\n!keep.py\n')
+    assert gitignore.match('f.py', False) is True
+    assert gitignore.match('keep.py', False) is False
+
+
+def _expand(*paths, excludes=()):
+    exclude = compile_excludes((*DEFAULT_EXCLUDES, *excludes))
+    return sorted(expand_paths([p.strpath for p in paths], exclude))
+
+
+def test_expand_paths(tmpdir):
+    tmpdir.join('a.py').ensure()
+    tmpdir.join('a.txt').ensure()
+    tmpdir.join('pkg/b.py').ensure()
+    tmpdir.join('pkg/sub/c.py').ensure()
+    tmpdir.join('.venv/lib/d.py').ensure()
+    tmpdir.join('build/lib/e.py').ensure()
+    tmpdir.join('pkg/__pycache__/f.py').ensure()
+    assert _expand(tmpdir) == [
+        tmpdir.join('a.py').strpath,
+        tmpdir.join('pkg/b.py').strpath,
+        tmpdir.join('pkg/sub/c.py').strpath,
+    ]
+
+
+def test_expand_paths_explicit_files_pass_through(tmpdir):
+    f = tmpdir.join('build/f.txt').ensure()
+    assert _expand(f) == [f.strpath]
+
+
+def test_expand_paths_exclude_patterns(tmpdir):
+    tmpdir.join('a.py').ensure()
+    tmpdir.join('a_pb2.py').ensure()
+    tmpdir.join('vendor/b.py').ensure()
+    assert _expand(tmpdir, excludes=('*_pb2.py', 'vendor')) == [
+        tmpdir.join('a.py').strpath,
+    ]
+
+
+def test_expand_paths_gitignore(tmpdir):
+    tmpdir.join('.gitignore').write('generated/\n*_gen.py\n')
+    tmpdir.join('a.py').ensure()
+    tmpdir.join('a_gen.py').ensure()
+    tmpdir.join('generated/b.py').ensure()
+    tmpdir.join('pkg/keep_gen.py').ensure()
+    tmpdir.join('pkg/.gitignore').write('!keep_gen.py\n')
+    tmpdir.join('pkg/other_gen.py').ensure()
+    assert _expand(tmpdir) == [
+        tmpdir.join('a.py').strpath,
+        tmpdir.join('pkg/keep_gen.py').strpath,
+    ]
+
+
+def test_expand_paths_order_is_sorted(tmpdir):
+    for name in ('b.py', 'a/z.py', 'a/b.py', 'C.py', 'a.py', 'c/a.py'):
+        tmpdir.join(name).ensure()
+    exclude = compile_excludes(DEFAULT_EXCLUDES)
+    assert list(expand_paths([tmpdir.strpath], exclude)) == [
+        tmpdir.join(name).strpath
+        for name in ('C.py', 'a/b.py', 'a/z.py', 'a.py', 'b.py', 'c/a.py')
+    ]
+
+
+def test_expand_paths_is_lazy(tmpdir):
+    tmpdir.join('a/b.py').ensure()
+    tmpdir.join('c/d.py').ensure()
+    exclude = compile_excludes(DEFAULT_EXCLUDES)
+    gen = expand_paths([tmpdir.strpath], exclude)
+    assert next(gen).endswith('.py')
+    gen.close()
+
+
+def _git(*cmd):
+    subprocess.check_call(
+        (
+            'git', '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+            *cmd,
+        ),
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def git_repo(tmpdir):
+    with tmpdir.as_cwd():
+        _git('init', '-q', '.')
+        tmpdir.join('.gitignore').write('ignored.py\n')
+        tmpdir.join('unchanged.py').write('x = 1\n')
+        tmpdir.join('modified.py').write('x = 1\n')
+        tmpdir.join('staged.py').write('x = 1\n')
+        tmpdir.join('deleted.py').write('x = 1\n')
+        tmpdir.join('pkg/committed.py').ensure().write('x = 1\n')
+        _git('add', '.')
+        _git('commit', '-q', '-m', 'initial')
+        _git('tag', 'base')
+        tmpdir.join('pkg/committed.py').write('x = 2\n')
+        _git('commit', '-q', '-am', 'second')
+
+        tmpdir.join('modified.py').write('x = 2\n')
+        tmpdir.join('staged.py').write('x = 2\n')
+        tmpdir.join('new_staged.py').write('x = 2\n')
+        _git('add', 'staged.py', 'new_staged.py')
+        tmpdir.join('deleted.py').remove()
+        tmpdir.join('untracked.py').write('x = 2\n')
+        tmpdir.join('untracked.txt').write('x = 2\n')
+        tmpdir.join('ignored.py').write('x = 2\n')
+        yield tmpdir
+
+
+def test_git_changed_files(git_repo):
+    assert git_changed_files('HEAD') == [
+        'modified.py',
+        'new_staged.py',
+        'staged.py',
+        'untracked.py',
+    ]
+    assert git_changed_files('base') == [
+        'modified.py',
+        'new_staged.py',
+        os.path.join('pkg', 'committed.py'),
+        'staged.py',
+        'untracked.py',
+    ]
+
+
+def test_git_changed_files_relative_to_cwd(git_repo):
+    with git_repo.join('pkg').as_cwd():
+        assert git_changed_files('base') == [
+            os.path.join('..', 'modified.py'),
+            os.path.join('..', 'new_staged.py'),
+            os.path.join('..', 'staged.py'),
+            os.path.join('..', 'untracked.py'),
+            'committed.py',
+        ]
+
+
+def test_git_changed_files_bad_ref(git_repo):
+    with pytest.raises(subprocess.CalledProcessError):
+        git_changed_files('does-not-exist')
+
+
+def test_filter_paths():
+    exclude = compile_excludes((*DEFAULT_EXCLUDES, 'gen_*.py'))
+    paths = ['a.py', 'pkg/b.py', 'pkg/gen_c.py', 'build/d.py', 'other/e.py']
+    paths = [os.path.normpath(path) for path in paths]
+    assert list(filter_paths(paths, [], exclude)) == [
+        'a.py', os.path.join('pkg', 'b.py'), os.path.join('other', 'e.py'),
+    ]
+    assert list(filter_paths(paths, ['pkg', 'a.py'], exclude)) == [
+        'a.py', os.path.join('pkg', 'b.py'),
+    ]
@@ -24,6 +24,16 @@ from pybreakingfix._main import _fix_plugins
             'task = asyncio.current_task(loop)\n',
             id='Task.current_task with arg',
         ),
+        pytest.param(
+            'asyncio.Task.all_tasks(\n    loop=loop,\n)\n',
+            'asyncio.all_tasks(\n    loop=loop,\n)\n',
+            id='Task.all_tasks arguments untouched',
+        ),
+        pytest.param(
+            'asyncio.Task.all_tasks(fractions.gcd(1, 2))\n',
+            'asyncio.all_tasks(math.gcd(1, 2))\n',
+            id='Task.all_tasks nested fix',
+        ),
     ),
 )
 def test_asyncio_task_methods(s, expected):
@@ -94,3 +94,22 @@ def test_collections_abc_already_imported():
         '    pass\n'
     )
     assert _fix_plugins(src, settings=Settings()) == expected
+
+
+def test_collections_abc_imports_concurrently():
+    """Test that the imports added to a file never leak into another one."""
+    import concurrent.futures
+
+    srcs = [
+        f'if isinstance(x, collections.{name}):\n    pass\n'
+        for name in ('Sized', 'Mapping', 'Hashable', 'Iterable') * 50
+    ]
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = executor.map(_fix_plugins, srcs, [Settings()] * len(srcs))
+        for src, result in zip(srcs, results):
+            name = src.split('.')[1].split(')')[0]
+            assert result == (
+                f'from collections.abc import {name}\n'
+                f'if isinstance(x, {name}):\n'
+                f'    pass\n'
+            )
@@ -2,7 +2,13 @@ from __future__ import annotations
 
 import pytest
 
-from pybreakingfix._main import _check_removed_modules
+from pybreakingfix._data import Settings
+from pybreakingfix._main import _visit_src
+
+
+def _removed_modules(s):
+    _, messages = _visit_src(s, Settings())
+    return [msg for msg in messages if msg.rule == 'removed-module']
 
 
 @pytest.mark.parametrize(
@@ -42,27 +48,27 @@ from pybreakingfix._main import _check_removed_modules
 )
 def test_removed_modules_detected(s, expected_module):
     """Test that removed modules are detected."""
-    errors = _check_removed_modules(s)
+    errors = _removed_modules(s)
     assert len(errors) == 1
-    assert errors[0][1] == expected_module
+    assert errors[0].args[0] == expected_module
 
 
 def test_removed_modules_not_detected():
     """Test that valid modules are not flagged."""
     s = 'import os\nimport sys\n'
-    errors = _check_removed_modules(s)
+    errors = _removed_modules(s)
     assert len(errors) == 0
 
 
 def test_removed_modules_multiple():
     """Test detection of multiple removed modules."""
     s = 'import distutils\nimport asyncore\n'
-    errors = _check_removed_modules(s)
+    errors = _removed_modules(s)
     assert len(errors) == 2
 
 
 def test_removed_modules_suggestion():
     """Test that suggestions are provided."""
     s = 'import distutils\n'
-    errors = _check_removed_modules(s)
-    assert 'setuptools' in errors[0][2].lower()
+    errors = _removed_modules(s)
+    assert 'setuptools' in errors[0].args[1].lower()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import pytest
+
+from pybreakingfix._data import Settings
+from pybreakingfix._main import _fix_plugins
+from pybreakingfix._plugins import renames
+from pybreakingfix._plugins.renames import Rule
+
+
+def test_compile_rules():
+    rule = Rule('r', 'a.b', 'c.b', (3, 9))
+    assert renames.compile_rules((rule,)) == {'a.b': rule}
+    with pytest.raises(ValueError):
+        renames.compile_rules((rule, rule._replace(replacement='d.b')))
+    with pytest.raises(ValueError):
+        renames.compile_rules((rule._replace(replacement='a.b'),))
+
+
+def test_rule_moved_to():
+    assert renames.DISPATCH['fractions.gcd'].moved_to == 'math'
+    assert renames.DISPATCH['collections.Sized'].moved_to == (
+        'collections.abc'
+    )
+    assert renames.DISPATCH['base64.encodestring'].moved_to is None
+
+
+def test_triggers():
+    assert renames.TRIGGERS == {
+        'asyncio', 'base64', 'collections', 'fractions',
+    }
+
+
+@pytest.mark.parametrize(
+    ('s', 'expected'),
+    (
+        pytest.param(
+            'from fractions import Fraction, gcd\n',
+            'from fractions import Fraction\n'
+            'from math import gcd\n',
+            id='mixed import split',
+        ),
+        pytest.param(
+            'from collections import Mapping as M\n',
+            'from collections.abc import Mapping as M\n',
+            id='import as',
+        ),
+        pytest.param(
+            'from collections import (\n'
+            '    Mapping,\n'
+            '    OrderedDict,\n'
+            ')\n',
+            'from collections import OrderedDict\n'
+            'from collections.abc import Mapping\n',
+            id='multi-line mixed import',
+        ),
+        pytest.param(
+            'from collections import Sized, Mapping\n'
+            'collections.Sized\n',
+            'from collections.abc import Sized, Mapping\n'
+            'Sized\n',
+            id='attribute already imported',
+        ),
+        pytest.param(
+            'def f():\n'
+            '    from collections import Mapping, OrderedDict\n'
+            '    return 1\n',
+            'def f():\n'
+            '    from collections import OrderedDict\n'
+            '    from collections.abc import Mapping\n'
+            '    return 1\n',
+            id='indented import split',
+        ),
+        pytest.param(
+            'if x:\n'
+            '    pass\n'
+            'else:\n'
+            '    from fractions import Fraction, gcd\n',
+            'if x:\n'
+            '    pass\n'
+            'else:\n'
+            '    from fractions import Fraction\n'
+            '    from math import gcd\n',
+            id='import split in a block',
+        ),
+        pytest.param(
+            'x = 1; from fractions import Fraction, gcd\n',
+            'x = 1; from fractions import Fraction; from math import gcd\n',
+            id='import split after a statement',
+        ),
+        pytest.param(
+            'from collections import Mapping, OrderedDict; '
+            'x = collections.Sized\n',
+            'from collections.abc import Sized\n'
+            'from collections import OrderedDict\n'
+            'from collections.abc import Mapping; x = Sized\n',
+            id='import split before a statement',
+        ),
+        pytest.param(
+            'from fractions import Fraction, gcd  # c\n',
+            'from fractions import Fraction\n'
+            'from math import gcd  # c\n',
+            id='import split keeps its comment',
+        ),
+    ),
+)
+def test_renames(s, expected):
+    assert _fix_plugins(s, settings=Settings()) == expected
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param('f = base64.encodestring\n', id='call rule not called'),
+        pytest.param('base64.encodestring.x()\n', id='call of an attribute'),
+        pytest.param('x.collections.Sized\n', id='not the module'),
+        pytest.param('a.b.c.d.e.f\n', id='long attribute chain'),
+        pytest.param('from base64 import encodestring\n', id='not moved'),
+        pytest.param('from .collections import Mapping\n', id='relative'),
+        pytest.param(
+            'x = (collections).Mapping\n', id='parenthesized module',
+        ),
+        pytest.param(
+            '(fractions).gcd(1, 2)\n', id='parenthesized call module',
+        ),
+        pytest.param(
+            '(asyncio.Task).current_task()\n', id='parenthesized class',
+        ),
+    ),
+)
+def test_renames_noop(s):
+    assert _fix_plugins(s, settings=Settings()) == s
+
+
+def test_renames_version_gate_import():
+    s = 'from fractions import gcd\n'
+    assert _fix_plugins(s, settings=Settings(min_version=(3, 8))) == s
@@ -1,12 +1,28 @@
 from __future__ import annotations
 
+import ast
+import collections
+import functools
 import io
+import json
+import os.path
+import subprocess
 import sys
+import time
 from unittest import mock
 
 import pytest
+from tokenize_rt import Offset
+from tokenize_rt import src_to_tokens
 
+from pybreakingfix import _ast_helpers
+from pybreakingfix import _data
+from pybreakingfix import _main
+from pybreakingfix import _manifest
+from pybreakingfix._data import Fix
+from pybreakingfix._data import Settings
 from pybreakingfix._main import main
+from pybreakingfix._token_helpers import OverlappingEditsError
 
 
 def test_main_trivial():
@@ -93,6 +109,21 @@ def test_main_removed_modules(tmpdir, capsys):
     assert 'removed' in err.lower()
 
 
+def test_main_overlapping_edits(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('collections.Sized\n')
+    g = tmpdir.join('g.py')
+    g.write('collections.Sized\n')
+    error = OverlappingEditsError('edit of tokens 0:1 overlaps')
+    with mock.patch.object(_main, '_apply_callbacks', side_effect=error):
+        assert main((f.strpath, g.strpath, '--jobs', '1')) == 2
+    _, err = capsys.readouterr()
+    # reported for each file, the run goes on
+    assert f'{f.strpath}:0: ERROR: fixes overlap' in err
+    assert f'{g.strpath}:0: ERROR: fixes overlap' in err
+    assert f.read() == g.read() == 'collections.Sized\n'
+
+
 def test_main_stdin_no_changes(capsys):
     stdin = io.TextIOWrapper(io.BytesIO(b'x = 1\n'), 'UTF-8')
     with mock.patch.object(sys, 'stdin', stdin):
@@ -107,3 +138,738 @@ def test_main_stdin_with_changes(capsys):
         assert main(('-',)) == 1
     out, err = capsys.readouterr()
     assert out == 'from collections.abc import Mapping\n'
+
+
+def test_main_potential_deprecated_warning(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('arr.tostring()\netree.tostring(root)\n')
+    assert main((f.strpath,)) == 0
+    out, err = capsys.readouterr()
+    assert f'{f.strpath}:1: WARNING: .tostring()' in err
+    assert ':2:' not in err
+
+
+def test_main_parses_once(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('import collections\nx = collections.Sized\narr.tostring()\n')
+    with mock.patch.object(
+        _ast_helpers, 'ast_parse', wraps=_ast_helpers.ast_parse,
+    ) as ast_parse_mock:
+        assert main((f.strpath,)) == 1
+    assert ast_parse_mock.call_count == 1
+
+
+def test_main_no_triggers_skips_parsing(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('import os\nprint(os.getcwd())\n')
+    with mock.patch.object(_ast_helpers, 'ast_parse') as ast_parse_mock:
+        assert main((f.strpath,)) == 0
+    assert not ast_parse_mock.called
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        'from collections import Mapping\n',
+        'x = collections.Sized\n',
+        'import distutils.core\n',
+        'arr.tostring()\n',
+        'fractions.gcd(1, 2)\n',
+        'asyncio.Task.all_tasks()\n',
+        'base64.encodestring(b"")\n',
+    ),
+)
+def test_has_triggers(s):
+    assert _main._has_triggers(s.encode())
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        'import os\n',
+        'import importlib\n',
+        'my_collections = 1\n',
+    ),
+)
+def test_has_triggers_no_match(s):
+    assert not _main._has_triggers(s.encode())
+
+
+def test_callback_positions():
+    src = (
+        'if x:\n'
+        '    if y:\n'
+        '        pass\n'
+        'collections.Sized\n'
+        'z = 1\n'
+    )
+    tokens = src_to_tokens(src)
+    funcs = [mock.Mock()]
+    callbacks = {Offset(4, 0): funcs, Offset(1, 3): funcs, Offset(9, 0): []}
+    positions = _main._callback_positions(tokens, callbacks)
+    assert [(tokens[i].src, f) for i, f in positions] == [
+        ('x', funcs), ('collections', funcs),
+    ]
+
+
+def _fix_partially(s):
+    statements = {}
+    callbacks, _ = _main._visit_src(s, Settings(), statements=statements)
+    fixes = []
+    ret = _main._apply_callbacks(s, callbacks, fixes=fixes)
+    partial_fixes = []
+    partial = _main._apply_callbacks(
+        s, callbacks, fixes=partial_fixes, statements=statements,
+    )
+    assert partial == ret
+    assert partial_fixes == fixes
+    return _main._segments(s, statements), ret
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param(
+            '@dec(collections.Sized)\n'
+            'def f():\n'
+            '    return base64.encodestring(x)\n',
+            id='decorator',
+        ),
+        pytest.param(
+            'class A(collections.Mapping):\n'
+            '    x = 1\n',
+            id='class header',
+        ),
+        pytest.param(
+            'if isinstance(x, collections.Sized):  # c\n'
+            '\n'
+            '    pass\n'
+            'else:\n'
+            '    z = base64.encodestring(b)\n',
+            id='if header and else',
+        ),
+        pytest.param(
+            'if x:\n'
+            '    if y:\n'
+            '        a = collections.Sized\n'
+            '    b = base64.encodestring(c)\n'
+            'd = fractions.gcd(1, 2)\n',
+            id='dedents',
+        ),
+        pytest.param(
+            'def f():\n'
+            '    from collections import Mapping, OrderedDict\n'
+            '    return 1\n',
+            id='indented import split',
+        ),
+        pytest.param(
+            'f(\n'
+            '    collections.Sized,\n'
+            '    fractions.gcd(1, 2),\n'
+            ')\n',
+            id='multi-line call',
+        ),
+        pytest.param(
+            'try:\n'
+            '    pass\n'
+            'except (collections.Sized,\n'
+            '        ValueError):\n'
+            '    pass\n',
+            id='except',
+        ),
+        pytest.param(
+            'match x:\n'
+            '    case 1:\n'
+            '        pass\n'
+            '    case collections.Sized():\n'
+            '        pass\n',
+            id='match case',
+        ),
+        pytest.param(
+            'x = 1; y = collections.Sized\n',
+            id='semicolon',
+        ),
+        pytest.param(
+            'x = (1,\n'
+            '2); y = collections.Sized\n',
+            id='semicolon after continuation',
+        ),
+        pytest.param(
+            'x = ("""\n'
+            '"""); y = collections.Sized\n',
+            id='semicolon after string',
+        ),
+        pytest.param(
+            'x = 1; y = (\n'
+            '    collections.Sized)\n'
+            'z = 2\n',
+            id='multi-line statement after semicolon',
+        ),
+        pytest.param(
+            'x = 1 + \\\n'
+            '    fractions.gcd(1, 2)\n',
+            id='backslash continuation',
+        ),
+        pytest.param(
+            's = "☃"; y = collections.Sized\n',
+            id='non-ascii before',
+        ),
+        pytest.param('x = 1\r\ny = collections.Sized\r\n', id='crlf'),
+        pytest.param('y = collections.Sized', id='no newline at eof'),
+    ),
+)
+def test_apply_callbacks_partially(s):
+    s = f'import os\n{s}'
+    _, ret = _fix_partially(s)
+    # the same with every segment tokenized into `CompactTokens`
+    with mock.patch.object(_main, 'COMPACT_TOKENS_THRESHOLD', 0):
+        assert _fix_partially(s)[1] == ret
+
+
+def test_apply_callbacks_partially_indented_import_split():
+    s = (
+        'def f():\n'
+        '    from collections import Mapping, OrderedDict\n'
+        '    return 1\n'
+    )
+    _, ret = _fix_partially(s)
+    assert ret == (
+        'def f():\n'
+        '    from collections import OrderedDict\n'
+        '    from collections.abc import Mapping\n'
+        '    return 1\n'
+    )
+
+
+def test_apply_callbacks_partially_only_tokenizes_statements():
+    s = (
+        'import collections\n'
+        'def f():\n'
+        '    x = 1\n'
+        '    return collections.Sized\n'
+        + 'y = 2\n' * 100 +
+        'z = fractions.gcd(1, 2)\n'
+    )
+    segments, ret = _fix_partially(s)
+    assert [s[start:end] for start, end, _ in segments] == [
+        '    return collections.Sized\n', 'z = fractions.gcd(1, 2)\n',
+    ]
+    assert ret.startswith('from collections.abc import Sized\n')
+    assert ret.endswith(
+        '    return Sized\n' + 'y = 2\n' * 100 + 'z = math.gcd(1, 2)\n',
+    )
+
+
+def test_visit_skips_untriggered_plugins():
+    calls = []
+
+    def plugin(state, node, parent):
+        calls.append(node)
+        return ()
+
+    funcs = collections.defaultdict(list, {ast.Call: [plugin]})
+    tree = ast.parse('foo()\nbar()\n')
+    with mock.patch.dict(_data.TRIGGERS, {plugin: frozenset(('foo',))}):
+        _data.visit(funcs, tree, Settings(), identifiers=frozenset(('bar',)))
+        assert calls == []
+        _data.visit(funcs, tree, Settings(), identifiers=frozenset(('foo',)))
+        assert len(calls) == 2
+
+
+VISIT_SRC = """\
+import collections
+from collections import Mapping
+
+@decorator(collections.Sized)
+def f(x: collections.Sized = g(), *a: int, **k: 'str') -> h(Mapping):
+    y: collections.Sized = lambda z=len(x): z.w
+    class C(collections.Mapping, metaclass=m()):
+        def g(self) -> None:
+            try:
+                from fractions import gcd
+            except (E, collections.F) as e:
+                print(f'{e.x!r:>{width}}')
+    match x:
+        case {'k': collections.Sized(), **rest} if rest.x:
+            return [a.b for a in c(d) if a.e]
+    return -x.y + 1
+"""
+
+
+def _walk(node, parent, in_annotation):
+    """every node, its parent and whether it is in an annotation, in order"""
+    yield node, parent, in_annotation
+    for name in node._fields:
+        value = getattr(node, name)
+        for child in value if isinstance(value, list) else (value,):
+            if isinstance(child, ast.AST):
+                annotation = name in {'annotation', 'returns'}
+                yield from _walk(child, node, in_annotation or annotation)
+
+
+@pytest.mark.parametrize(
+    'types',
+    (
+        (ast.Attribute, ast.Call, ast.Name, ast.Constant, ast.arg),
+        (ast.FunctionDef, ast.ExceptHandler, ast.match_case, ast.ImportFrom),
+        (ast.keyword, ast.alias, ast.comprehension, ast.MatchClass),
+    ),
+)
+def test_visit_order(types):
+    seen = []
+
+    def plugin(state, node, parent):
+        seen.append((node, parent, state.in_annotation))
+        return ()
+
+    tree = ast.parse(VISIT_SRC)
+    _data.visit({tp: [plugin] for tp in types}, tree, Settings())
+    assert seen == [
+        (node, parent, in_annotation)
+        for node, parent, in_annotation in _walk(tree, tree, False)
+        if type(node) in types
+    ]
+
+
+def test_visit_statements_only():
+    dispatch, fields = _data._dispatch(
+        {ast.ImportFrom: [lambda *args: ()]}, None, None, False, False,
+    )
+    assert fields is _data._STATEMENT_FIELDS
+    assert fields[ast.Expr] == fields[ast.Attribute] == ()
+
+    dispatch, fields = _data._dispatch(
+        {ast.ImportFrom: [], ast.Call: [lambda *args: ()]},
+        None, None, False, False,
+    )
+    assert fields is _data._FIELDS
+
+    dispatch, fields = _data._dispatch({}, None, None, False, False)
+    assert dispatch == fields == {}
+
+
+def test_visit_records_from_imports():
+    states = []
+
+    def plugin(state, node, parent):
+        states.append({k: set(v) for k, v in state.from_imports.items()})
+        return ()
+
+    tree = ast.parse(
+        'import os\n'
+        'from collections import Mapping, Sized as S\n'
+        'if x:\n'
+        '    import sys\n'
+        '    from os import path\n',
+    )
+    _data.visit({ast.Import: [plugin]}, tree, Settings())
+    assert states == [{}, {'collections': {'Mapping'}}]
+
+
+def test_register_leaf_type():
+    with pytest.raises(TypeError):
+        _data.register(ast.Load)
+
+
+def test_visit_definite_stops_early():
+    calls = []
+
+    def plugin(state, node, parent):
+        calls.append(node)
+        yield Offset(node.lineno, node.col_offset), print
+
+    def other_plugin(state, node, parent):
+        calls.append(node)
+        return ()
+
+    funcs = collections.defaultdict(list, {ast.Call: [plugin]})
+    tree = ast.parse('foo()\nfoo()\nfoo()\n')
+    with mock.patch.object(_data, 'DEFINITE', {plugin}):
+        definite = []
+        callbacks, _ = _data.visit(funcs, tree, Settings(), definite=definite)
+        assert callbacks == {}
+        assert definite == [(Offset(line, 0), print) for line in (1, 2, 3)]
+
+        calls.clear()
+        definite.clear()
+        settings = Settings(check_only=True, report_fixes=False)
+        _data.visit(funcs, tree, settings, definite=definite)
+        assert definite == [(Offset(1, 0), print)]
+        assert len(calls) == 1
+
+        # the other plugins still see everything
+        calls.clear()
+        funcs[ast.Expr] = [other_plugin]
+        _data.visit(funcs, tree, settings, definite=[])
+        types = [type(node) for node in calls]
+        assert types == [ast.Expr, ast.Call, ast.Expr, ast.Expr]
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        'from collections import Mapping\n',
+        'x = collections.Sized\narr.tostring()\nfractions.gcd(1, 2)\n',
+        'from fractions import Fraction, gcd\nbase64.encodestring(b"")\n',
+        'x = 1\n',
+    ),
+)
+def test_fix_contents_check_only(s):
+    ret, messages, new_contents = _main._fix_contents(s.encode(), Settings())
+    with mock.patch.object(_main, '_apply_callbacks') as apply_mock:
+        result = _main._fix_contents(s.encode(), Settings(check_only=True))
+    assert not apply_mock.called
+    assert result == (ret, messages, new_contents and b'')
+
+
+def test_fix_contents_check_only_first_fix():
+    s = b'x = collections.Sized\nfractions.gcd(1, 2)\narr.tostring()\n'
+    settings = Settings(check_only=True, report_fixes=False)
+    ret, messages, new_contents = _main._fix_contents(s, settings)
+    assert (ret, new_contents) == (1, b'')
+    assert [(msg.line, msg.severity) for msg in messages] == [
+        (1, 'fix'), (3, 'warning'),
+    ]
+
+    # the removed modules are still found after the first fix
+    ret, _, _ = _main._fix_contents(s + b'import imp\n', settings)
+    assert ret == 2
+
+
+def test_fix_rule():
+    def _fix_some_thing(i, tokens):
+        raise AssertionError('not called')
+
+    assert _main._fix_rule(Fix('a-rule', _fix_some_thing)) == 'a-rule'
+    # (a callback which is not a `Fix` is named after its function)
+    assert _main._fix_rule(_fix_some_thing) == 'some-thing'
+    wrapped = functools.partial(_fix_some_thing)
+    assert _main._fix_rule(Fix('a-rule', wrapped)) == 'a-rule'
+
+
+def test_trigger_identifiers():
+    ret = _data.trigger_identifiers(b'import collections\nfractions.gcd\n')
+    assert ret == {'collections', 'fractions'}
+
+
+def test_trigger_identifiers_stops_once_all_are_seen():
+    words = ' '.join(_manifest.TRIGGER_MODULES).encode()
+    with mock.patch.object(
+            _data, 'TRIGGER_RE', wraps=_data.TRIGGER_RE,
+    ) as trigger_re:
+        trigger_re.finditer.return_value = iter(
+            [*_data.TRIGGER_RE.finditer(words), None],
+        )
+        ret = _data.trigger_identifiers(words)
+    assert ret == set(_manifest.TRIGGER_MODULES)
+
+
+def test_all_plugins_declare_triggers():
+    assert _main.TRIGGER_RE is not None
+
+
+def _repo_env():
+    """the environment of a subprocess importing this checkout"""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pythonpath = os.environ.get('PYTHONPATH')
+    if pythonpath:
+        repo = os.pathsep.join((repo, pythonpath))
+    return {**os.environ, 'PYTHONPATH': repo}
+
+
+def test_manifest_up_to_date():
+    generated = subprocess.check_output(
+        (sys.executable, 'testing/generate-manifest'),
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        env=_repo_env(),
+        text=True,
+    )
+    with open(_manifest.__file__) as f:
+        assert f.read() == generated, 'run testing/generate-manifest'
+
+
+def test_import_does_not_load_plugins():
+    code = (
+        'import sys\n'
+        'import pybreakingfix._main\n'
+        'print(sorted(m for m in sys.modules if m.startswith("tokenize_rt") '
+        'or m.startswith("pybreakingfix._plugins.")))\n'
+    )
+    out = subprocess.check_output(
+        (sys.executable, '-c', code), env=_repo_env(), text=True,
+    )
+    assert out == '[]\n'
+
+
+def _write_files(tmpdir):
+    files = []
+    for i, s in enumerate((
+            'from collections import Mapping\n',
+            'x = 1\n',
+            'import imp\n',
+            'arr.tostring()\n',
+            'fractions.gcd(1, 2)\n',
+    ) * 3):
+        f = tmpdir.join(f'f{i}.py')
+        f.write(s)
+        files.append(f.strpath)
+    return files
+
+
+@pytest.mark.parametrize('executor', ('processes', 'threads'))
+@pytest.mark.parametrize('check', ((), ('--check',)))
+def test_main_jobs_matches_serial(tmpdir, capsys, check, executor):
+    serial_files = _write_files(tmpdir.mkdir('serial'))
+    parallel_files = _write_files(tmpdir.mkdir('parallel'))
+
+    assert main((*serial_files, *check, '--jobs', '1')) == 2
+    serial_out, serial_err = capsys.readouterr()
+    jobs_args = ('--jobs', '3', '--executor', executor)
+    assert main((*parallel_files, *check, *jobs_args)) == 2
+    out, err = capsys.readouterr()
+
+    assert out.replace('parallel', 'serial') == serial_out
+    assert err.replace('parallel', 'serial') == serial_err
+    for serial, parallel in zip(serial_files, parallel_files):
+        with open(serial) as f1, open(parallel) as f2:
+            assert f1.read() == f2.read()
+
+
+@pytest.mark.parametrize(
+    ('is_gil_enabled', 'expected'),
+    ((True, 'processes'), (False, 'threads')),
+)
+def test_default_executor(is_gil_enabled, expected):
+    with mock.patch.object(
+            sys, '_is_gil_enabled', lambda: is_gil_enabled, create=True,
+    ):
+        assert _main._default_executor() == expected
+
+
+def test_default_executor_before_free_threading(monkeypatch):
+    monkeypatch.delattr(sys, '_is_gil_enabled', raising=False)
+    assert _main._default_executor() == 'processes'
+
+
+def test_load_plugins():
+    _data.load_plugins()
+    funcs = dict(_data.FUNCS)
+    for tp in (ast.Name, ast.Call, ast.ImportFrom, ast.Attribute):
+        assert _data.FUNCS[tp] is funcs[tp]
+    assert not funcs[ast.Name]
+    assert funcs[ast.Call]
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_directory(tmpdir, capsys, jobs):
+    tmpdir.join('a.py').write('from collections import Mapping\n')
+    tmpdir.join('pkg/b.py').ensure().write('from collections import Sized\n')
+    tmpdir.join('build/c.py').ensure().write('from collections import Set\n')
+    assert main((tmpdir.strpath, '--jobs', jobs)) == 1
+    assert tmpdir.join('a.py').read() == (
+        'from collections.abc import Mapping\n'
+    )
+    assert tmpdir.join('pkg/b.py').read() == (
+        'from collections.abc import Sized\n'
+    )
+    assert tmpdir.join('build/c.py').read() == 'from collections import Set\n'
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_fail_fast(tmpdir, capsys, jobs):
+    files = _write_files(tmpdir)
+    args = ('--check', '--jobs', jobs)
+
+    assert main((*files, *args, '--fail-fast')) == 2
+    out, err = capsys.readouterr()
+    # only the finding stopping the run is reported
+    assert out == ''
+    assert f'{files[2]}:1: ERROR' in err
+    assert err.count('\n') == 1
+
+    assert main((*files, *args, '--fail-fast-on-changes')) == 1
+    out, err = capsys.readouterr()
+    assert (out, err) == (f'{files[0]}: would be rewritten\n', '')
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_fail_fast_not_stopping_reports_everything(tmpdir, capsys, jobs):
+    files = [f for f in _write_files(tmpdir) if 'imp' not in open(f).read()]
+    args = ('--check', '--jobs', jobs)
+
+    assert main((*files, *args, '--fail-fast')) == 1
+    fail_fast_output = capsys.readouterr()
+    assert main((*files, *args)) == 1
+    assert fail_fast_output == capsys.readouterr()
+    assert 'would be rewritten' in fail_fast_output.out
+    assert 'WARNING' in fail_fast_output.err
+
+
+def test_main_fail_fast_cancels_queued_batches(tmpdir):
+    files = [tmpdir.join(f'f{i}.py') for i in range(10)]
+    for f in files:
+        f.write('import imp\n')
+
+    fix_files = _main._fix_files
+
+    def slow_fix_files(*args):
+        time.sleep(.05)
+        return fix_files(*args)
+
+    args = ('--check', '--fail-fast', '--jobs', '2', '--executor', 'threads')
+    with (
+            mock.patch.object(_main, 'BATCH_SIZE', 1),
+            mock.patch.object(
+                _main, '_fix_files', side_effect=slow_fix_files,
+            ) as fix_files_mock,
+    ):
+        assert main((*(f.strpath for f in files), *args)) == 2
+    # 8 batches were submitted: the first 2 and perhaps the 2 started as
+    # they came back ran, the others were cancelled
+    assert fix_files_mock.call_count <= 4
+
+
+def test_main_fail_fast_requires_check(capsys):
+    with pytest.raises(SystemExit):
+        main(('--fail-fast', 'f.py'))
+    _, err = capsys.readouterr()
+    assert 'can only be used with --check' in err
+
+
+def test_main_changed_since(tmpdir, capsys):
+    def _git(*cmd):
+        subprocess.check_call(
+            ('git', '-c', 'user.name=t', '-c', 'user.email=t@t', *cmd),
+            stdout=subprocess.DEVNULL,
+        )
+
+    with tmpdir.as_cwd():
+        _git('init', '-q', '.')
+        tmpdir.join('old.py').write('from collections import Mapping\n')
+        _git('add', '.')
+        _git('commit', '-q', '-m', 'initial')
+        tmpdir.join('new.py').write('from collections import Sized\n')
+
+        assert main(('--changed-since', 'HEAD', '--check')) == 1
+        out, _ = capsys.readouterr()
+        assert out == 'new.py: would be rewritten\n'
+
+        tmpdir.join('new.py').write('import imp\n')
+        assert main(('--changed-since', 'HEAD')) == 2
+
+        with pytest.raises(SystemExit):
+            main(('--changed-since', 'does-not-exist'))
+        _, err = capsys.readouterr()
+        assert '--changed-since' in err
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_timings(tmpdir, capsys, jobs):
+    files = _write_files(tmpdir)
+    args = ('--no-cache', '--timings', '--jobs', jobs)
+    assert main((*files, *args)) == 2
+    out, err = capsys.readouterr()
+    phases = err[err.index('phase '):err.index('\ntotal ')]
+    rows = [line.split() for line in phases.splitlines()[1:]]
+    assert [row[0] for row in rows] == [
+        'read', 'prescreen', 'decode', 'parse', 'visit', 'tokenize',
+        'positions', 'fixup', 'callbacks', 'src', 'write',
+    ]
+    # every file parsed is counted, regardless of the worker doing it
+    assert dict((row[0], row[-2]) for row in rows)['parse'] == '12'
+    assert '\nrenames.visit_ImportFrom ' in err
+    assert '\nrenames._fix_moved_import_module ' in err
+    assert '\nslowest files:\n' in err
+    assert len(err[err.index('slowest files:'):].splitlines()) == 11
+
+
+@pytest.mark.parametrize(
+    's',
+    (
+        pytest.param('x = collections.Mapping\n', id='fixed'),
+        pytest.param("x = f'{collections.Mapping}'\n", id='in an f-string'),
+        pytest.param('x = (collections).Mapping\n', id='parenthesized'),
+        pytest.param('(fractions).gcd(1, 2)\n', id='parenthesized call'),
+        pytest.param(
+            '(asyncio.Task).current_task()\n', id='parenthesized class',
+        ),
+    ),
+)
+def test_main_check_agrees_with_fix(tmpdir, capsys, s):
+    f = tmpdir.join('f.py')
+    f.write(s)
+    args = (f.strpath, '--no-cache', '--jobs', '1')
+    check_ret = main((*args, '--check'))
+    check_out, _ = capsys.readouterr()
+    check_json_ret = main((*args, '--check', '--format', 'json'))
+    check_json, _ = capsys.readouterr()
+
+    ret = main((*args, '--format', 'json'))
+    out, _ = capsys.readouterr()
+    assert check_ret == check_json_ret == ret
+    assert ('would be rewritten' in check_out) == (f.read() != s)
+
+    def _findings(s):
+        # (a fix is "would fix" with --check)
+        return [
+            {k: v for k, v in finding.items() if k != 'message'}
+            for finding in json.loads(s)
+        ]
+    assert _findings(check_json) == _findings(out)
+
+
+def test_main_check_timings(tmpdir, capsys):
+    args = ('--check', '--no-cache', '--timings', '--jobs', '1')
+    assert main((*_write_files(tmpdir), *args)) == 2
+    _, err = capsys.readouterr()
+    phases = err[err.index('phase '):err.index('\ntotal ')]
+    rows = [line.split() for line in phases.splitlines()[1:]]
+    # every fix is certain to change its file: nothing is tokenized
+    assert [row[0] for row in rows] == [
+        'read', 'prescreen', 'decode', 'parse', 'visit',
+    ]
+
+
+def test_main_no_timings(tmpdir, capsys):
+    assert main((*_write_files(tmpdir), '--check')) == 2
+    out, err = capsys.readouterr()
+    assert 'slowest files' not in err
+
+
+@pytest.mark.parametrize(
+    ('s', 'expected'),
+    (
+        (b'', True),
+        (b'x = 1\n', True),
+        ('x = "☃☃☃"\n'.encode(), True),
+        (b'x = "\xa0"\n', False),
+        # truncated multi-byte sequence
+        ('x = "☃"'.encode()[:-2], False),
+    ),
+)
+def test_is_utf8(s, expected):
+    # small chunks: multi-byte sequences are split across them
+    with mock.patch.object(_main, 'CHUNK_SIZE', 2):
+        assert _main._is_utf8(s) is expected
+
+
+def test_main_memory_mapped_input(tmpdir, capsys):
+    fixed = tmpdir.join('fixed.py')
+    fixed.write_binary('# ☃\nfrom collections import Mapping\n'.encode())
+    warned = tmpdir.join('warned.py')
+    warned.write('arr.tostring()\n')
+    non_utf8 = tmpdir.join('non_utf8.py')
+    non_utf8.write_binary(b'# \xa0\nfrom collections import Mapping\n')
+    empty = tmpdir.join('empty.py')
+    empty.write('')
+
+    files = (fixed.strpath, warned.strpath, non_utf8.strpath, empty.strpath)
+    with mock.patch.object(_main, 'MMAP_THRESHOLD', 1):
+        assert main((*files, '--jobs', '1')) == 1
+    out, err = capsys.readouterr()
+    assert f'{non_utf8.strpath} is non-utf-8 (not supported)' in out
+    assert f'{warned.strpath}:1: WARNING: .tostring()' in err
+    assert fixed.read_binary() == (
+        '# ☃\nfrom collections.abc import Mapping\n'.encode()
+    )
+    assert warned.read() == 'arr.tostring()\n'
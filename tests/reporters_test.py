@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+from pybreakingfix import _reporters
+from pybreakingfix._data import Message
+from pybreakingfix._main import main
+
+ERROR = Message(1, 0, 'removed-module', 'error', ('imp', 'Use importlib'))
+WARNING = Message(
+    4, 2, 'potential-deprecated-method', 'warning',
+    ('isAlive', 'threading.Thread', '.is_alive()', ''),
+)
+FIX = Message(3, 4, 'fractions-gcd', 'fix', ())
+NON_UTF8 = Message(0, 0, 'non-utf-8', 'error', ())
+
+
+@pytest.mark.parametrize(
+    ('msg', 'expected'),
+    (
+        (ERROR, 'module "imp" has been removed. Use importlib'),
+        (
+            WARNING,
+            '.isAlive() - check if this is threading.Thread, '
+            'if so use .is_alive() instead',
+        ),
+        (FIX, 'fixed: fractions-gcd'),
+        (NON_UTF8, 'file is non-utf-8 (not supported)'),
+        (
+            Message(0, 0, 'overlapping-edits', 'error', ('overlap',)),
+            'fixes overlap, file left unchanged: overlap',
+        ),
+    ),
+)
+def test_message_text(msg, expected):
+    assert _reporters.message_text(msg) == expected
+
+
+def test_message_text_check_only():
+    assert _reporters.message_text(FIX, check_only=True) == (
+        'would fix: fractions-gcd'
+    )
+    assert _reporters.message_text(ERROR, check_only=True) == (
+        _reporters.message_text(ERROR)
+    )
+
+
+@pytest.mark.parametrize('fmt', ('json', 'jsonl', 'sarif'))
+def test_main_format_check_does_not_claim_fixes(tmpdir, capsys, fmt):
+    tmpdir.join('f.py').write('from collections import Sized\n')
+    with tmpdir.as_cwd():
+        assert main(('f.py', '--check', f'--format={fmt}')) == 1
+    out, err = capsys.readouterr()
+    assert 'would fix: collections-abc' in out
+    assert 'fixed:' not in out
+
+
+def _report(fmt, messages, check_only=False):
+    out = io.StringIO()
+    reporter = _reporters.REPORTERS[fmt](out, check_only=check_only)
+    for filename, msg in messages:
+        reporter.add(filename, msg)
+    reporter.close()
+    return out.getvalue()
+
+
+MESSAGES = (('a.py', ERROR), ('b.py', WARNING), ('b.py', FIX))
+
+
+def test_jsonl_reporter():
+    lines = _report('jsonl', MESSAGES).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {
+            'file': 'a.py',
+            'line': 1,
+            'col': 0,
+            'rule': 'removed-module',
+            'severity': 'error',
+            'message': 'module "imp" has been removed. Use importlib',
+            'args': ['imp', 'Use importlib'],
+        },
+        {
+            'file': 'b.py',
+            'line': 4,
+            'col': 2,
+            'rule': 'potential-deprecated-method',
+            'severity': 'warning',
+            'message': (
+                '.isAlive() - check if this is threading.Thread, '
+                'if so use .is_alive() instead'
+            ),
+            'args': ['isAlive', 'threading.Thread', '.is_alive()', ''],
+        },
+        {
+            'file': 'b.py',
+            'line': 3,
+            'col': 4,
+            'rule': 'fractions-gcd',
+            'severity': 'fix',
+            'message': 'fixed: fractions-gcd',
+            'args': [],
+        },
+    ]
+
+
+def test_json_reporter():
+    ret = json.loads(_report('json', MESSAGES))
+    assert [(r['file'], r['rule']) for r in ret] == [
+        ('a.py', 'removed-module'),
+        ('b.py', 'potential-deprecated-method'),
+        ('b.py', 'fractions-gcd'),
+    ]
+
+
+@pytest.mark.parametrize('fmt', ('json', 'jsonl', 'sarif'))
+def test_reporter_no_messages(fmt):
+    ret = _report(fmt, ())
+    if fmt == 'jsonl':
+        assert ret == ''
+    elif fmt == 'json':
+        assert json.loads(ret) == []
+    else:
+        assert json.loads(ret)['runs'][0]['results'] == []
+
+
+def test_sarif_reporter():
+    ret = json.loads(_report('sarif', (*MESSAGES, ('c.py', NON_UTF8))))
+    assert ret['version'] == '2.1.0'
+    run, = ret['runs']
+    assert run['tool']['driver']['rules'] == [
+        {'id': 'fractions-gcd'},
+        {'id': 'non-utf-8'},
+        {'id': 'potential-deprecated-method'},
+        {'id': 'removed-module'},
+    ]
+    assert run['results'][0] == {
+        'ruleId': 'removed-module',
+        'level': 'error',
+        'message': {'text': 'module "imp" has been removed. Use importlib'},
+        'locations': [{
+            'physicalLocation': {
+                'artifactLocation': {'uri': 'a.py'},
+                'region': {'startLine': 1, 'startColumn': 1},
+            },
+        }],
+    }
+    assert run['columnKind'] == 'utf16CodeUnits'
+    assert [r['level'] for r in run['results']] == [
+        'error', 'warning', 'note', 'error',
+    ]
+    # (b.py cannot be read to convert the column)
+    assert run['results'][1]['locations'][0]['physicalLocation'][
+        'region'
+    ] == {'startLine': 4}
+    # no line to point at
+    assert 'region' not in run['results'][3]['locations'][0][
+        'physicalLocation'
+    ]
+
+
+def test_reporter_buffers_output(monkeypatch):
+    monkeypatch.setattr(_reporters, 'BUFFER_SIZE', 1000)
+    out = io.StringIO()
+    reporter = _reporters.JSONLinesReporter(out, check_only=False)
+    reporter.add('a.py', FIX)
+    assert out.getvalue() == ''
+    for _ in range(10):
+        reporter.add('a.py', FIX)
+    line_size = len(_report('jsonl', [('a.py', FIX)]))
+    assert 0 < len(out.getvalue()) < 11 * line_size
+    reporter.close()
+    assert len(out.getvalue().splitlines()) == 11
+
+
+def test_main_format_jsonl(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write(
+        'import base64\n'
+        'from collections import Mapping\n'
+        'x.isAlive()\n'
+        'base64.encodestring(b"")\n',
+    )
+    assert main((f.strpath, '--format', 'jsonl')) == 1
+    out, err = capsys.readouterr()
+    assert err == ''
+    results = [json.loads(line) for line in out.splitlines()]
+    assert [(r['line'], r['rule'], r['severity']) for r in results] == [
+        (2, 'collections-abc', 'fix'),
+        (3, 'potential-deprecated-method', 'warning'),
+        (4, 'base64-bytes', 'fix'),
+    ]
+    assert {r['file'] for r in results} == {f.strpath}
+    # the file is still rewritten
+    assert 'collections.abc' in f.read()
+
+
+def test_main_format_sarif_removed_module(tmpdir, capsys):
+    tmpdir.join('f.py').write('import imp\n')
+    with tmpdir.as_cwd():
+        assert main(('f.py', '--check', '--format=sarif')) == 2
+    out, err = capsys.readouterr()
+    result, = json.loads(out)['runs'][0]['results']
+    assert result['ruleId'] == 'removed-module'
+    assert result['level'] == 'error'
+
+
+def test_main_format_sarif_columns(tmpdir, capsys):
+    # utf-8 byte offset 15, utf-16 offset 11
+    tmpdir.join('f.py').write_text(
+        's = "\u2603\U0001f600"; x.isAlive()\n', encoding='UTF-8',
+    )
+    with tmpdir.as_cwd():
+        assert main(('f.py', '--check', '--format=sarif')) == 0
+    out, err = capsys.readouterr()
+    result, = json.loads(out)['runs'][0]['results']
+    assert result['locations'][0]['physicalLocation']['region'] == {
+        'startLine': 1, 'startColumn': 12,
+    }
+
+
+def test_reporter_is_abstract():
+    with pytest.raises(TypeError):
+        _reporters.Reporter(  # type: ignore[abstract]
+            io.StringIO(), check_only=False,
+        )
+
+
+def test_main_format_stdin(capsys):
+    with pytest.raises(SystemExit):
+        main(('-', '--format=json'))
+    out, err = capsys.readouterr()
+    assert '--format=json cannot be used with stdin' in err
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import functools
+import io
+import pickle
+
+from pybreakingfix import _timings
+from pybreakingfix._data import Fix
+from pybreakingfix._plugins import renames
+from pybreakingfix._timings import Timings
+
+
+def test_func_name():
+    func = functools.partial(
+        renames._fix_renamed_attribute,
+        rule=renames.DISPATCH['collections.Sized'],
+        needs_import=True,
+    )
+    assert _timings.func_name(func) == 'renames._fix_renamed_attribute'
+    fix = Fix('collections-abc', func)
+    assert _timings.func_name(fix) == 'renames._fix_renamed_attribute'
+    assert _timings.func_name(test_func_name) == (
+        'tests.timings_test.test_func_name'
+    )
+
+
+def test_timings_lap():
+    timings = Timings()
+    timings.lap('read')
+    timings.lap('read')
+    timings.lap('parse')
+    assert timings.calls == {'read': 2, 'parse': 1}
+    assert list(timings.phases) == ['read', 'parse']
+
+
+def test_timings_keeps_slowest_files():
+    timings = Timings()
+    for i in range(_timings.SLOWEST_FILES * 3):
+        timings.add_file(f'f{i}.py', float(i))
+    assert sorted(timings.files) == [
+        (float(i), f'f{i}.py')
+        for i in range(_timings.SLOWEST_FILES * 2, _timings.SLOWEST_FILES * 3)
+    ]
+
+
+def test_timings_merge():
+    first, second = Timings(), Timings()
+    first.phases['parse'] = 1.
+    first.add_plugin('renames.visit_Attribute', 2.)
+    first.add_file('a.py', 1.)
+    second.phases['parse'] = 3.
+    second.add_plugin('renames.visit_Attribute', 4.)
+    second.add_file('b.py', 3.)
+
+    # as the workers send them back
+    first.merge(pickle.loads(pickle.dumps(second)))
+    assert first.phases == {'parse': 4.}
+    assert first.plugins == {'renames.visit_Attribute': 6.}
+    assert first.calls['renames.visit_Attribute'] == 2
+    assert sorted(first.files) == [(1., 'a.py'), (3., 'b.py')]
+
+
+def test_timings_report():
+    timings = Timings()
+    timings.phases.update({'read': .5, 'parse': 1.})
+    timings.calls.update({'read': 2, 'parse': 2})
+    timings.add_plugin('renames.visit_Attribute', .25)
+    timings.add_file('a.py', 1.5)
+    out = io.StringIO()
+    timings.report(out)
+    assert out.getvalue() == (
+        'phase    calls    seconds\n'
+        'read         2     0.5000\n'
+        'parse        2     1.0000\n'
+        'total              1.5000\n'
+        '\n'
+        'plugin / callback          calls    seconds\n'
+        'renames.visit_Attribute        1     0.2500\n'
+        '\n'
+        'slowest files:\n'
+        '    1.5000 a.py\n'
+    )
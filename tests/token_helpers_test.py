@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import pytest
+from tokenize_rt import src_to_tokens
+from tokenize_rt import Token
+
+from pybreakingfix._token_helpers import find_block_start
+from pybreakingfix._token_helpers import find_closing_bracket
+from pybreakingfix._token_helpers import find_end
+from pybreakingfix._token_helpers import OverlappingEditsError
+from pybreakingfix._token_helpers import Tokens
+
+
+def _tokens(s):
+    return Tokens(src_to_tokens(s))
+
+
+def test_tokens_no_edits():
+    assert _tokens('x = (1, 2)\n').src() == 'x = (1, 2)\n'
+
+
+def test_tokens_edits_applied_in_order():
+    tokens = _tokens('a = b + c\n')
+    # recorded out of order, as the reversed sweep does
+    tokens.replace(8, 9, (Token('CODE', 'see'),))
+    tokens.replace(0, 1, (Token('CODE', 'eh'),))
+    assert tokens.src() == 'eh = b + see\n'
+
+
+def test_tokens_edit_and_in_place_replacement():
+    tokens = _tokens('a = b\n')
+    tokens[0] = tokens[0]._replace(src='eh')
+    tokens.replace(4, 5, (Token('CODE', 'bee'),))
+    assert tokens.src() == 'eh = bee\n'
+
+
+def test_tokens_deletion_and_insertion():
+    tokens = _tokens('f(a, b)\n')
+    tokens.replace(2, 5, ())
+    tokens.replace(2, 2, (Token('CODE', 'x, '),))
+    assert tokens.src() == 'f(x, b)\n'
+
+
+def test_tokens_overlapping_edits():
+    tokens = _tokens('a = b + c\n')
+    tokens.replace(4, 7, (Token('CODE', 'd'),))
+    tokens.replace(0, 5, (Token('CODE', 'e'),))
+    with pytest.raises(OverlappingEditsError):
+        tokens.src()
+
+
+def test_tokens_refuses_splicing():
+    tokens = _tokens('a = b\n')
+    with pytest.raises(TypeError):
+        tokens[0:1] = [Token('CODE', 'eh')]
+
+
+def test_token_index_find():
+    tokens = _tokens('a.b(a, c)\na\n')
+    assert tokens.token_index.find(0, 'NAME', 'a') == 0
+    assert tokens.token_index.find(1, 'NAME', 'a') == 4
+    assert tokens.token_index.find(5, 'NAME', 'a') == 10
+    assert tokens.token_index.find(11, 'NAME', 'a') is None
+    assert tokens.token_index.find(0, 'OP', '(') == 3
+    assert tokens.token_index.find(0, 'NAME', 'd') is None
+
+
+def test_token_index_brackets_and_lines():
+    tokens = _tokens('x = f([1], {2: 3})\ny = 1\n')
+    assert find_closing_bracket(tokens, 5) == 17
+    assert find_closing_bracket(tokens, 11) == 16
+    assert find_closing_bracket(tokens, 6) == 8
+    assert tokens[find_end(tokens, 0)].src == 'y'
+
+
+def test_token_index_find_same_depth():
+    tokens = _tokens('if x[1:2] and {a: b}:\n    pass\n')
+    colon = find_block_start(tokens, 0)
+    assert tokens[colon].src == ':'
+    assert tokens[colon + 1].name == 'NEWLINE'
+
+
+def test_token_index_in_place_replacement():
+    tokens = _tokens('collections.Sized\ncollections.Sized\n')
+    assert tokens.token_index.find(0, 'NAME', 'collections') == 0
+    tokens[0] = tokens[0]._replace(src='abc')
+    assert tokens.token_index.find(0, 'NAME', 'collections') == 4
+    assert tokens.token_index.find(0, 'NAME', 'abc') == 0
+    assert tokens.token_index.offsets[tokens[4].offset] == 4